@@ -5,55 +5,43 @@ import json
 from datetime import datetime
 from fpdf import FPDF
 import os
-import time
+from catalog_index import get_catalog_index
+from llm import GeminiBackend, cache_key, stream_cached, get_response_cache
 
 # --- CONFIGURATION ---
 st.set_page_config(page_title="AquaRisk AI Terminal", page_icon="💧", layout="wide")
 
 # --- 1. LE CERVEAU (GEMINI + CATALOGUE) ---
 class SmartAnalyst:
-    def __init__(self, api_key=None):
+    def __init__(self, api_key=None, backend=None, cache=None):
+        """backend : ModelBackend (voir llm.py) ; par défaut Gemini si une clé est fournie, sinon mode simulation.
+        cache : ResponseCache (par défaut le cache partagé), False pour le désactiver."""
         self.api_key = api_key
-        # Chargement du catalogue de données
-        try:
-            self.catalog = pd.read_csv("risk_data_sources_catalog.csv")
-        except:
-            # Fallback si le fichier n'est pas là
-            self.catalog = pd.DataFrame([
-                {"dataset": "WRI Aqueduct", "provider": "WRI", "typical_use": "Stress Hydrique"},
-                {"dataset": "IMF Climate Data", "provider": "IMF", "typical_use": "Risque Macro"}
-            ])
+        self._backend = backend
+        self.cache = get_response_cache() if cache is None else cache
+        # Catalogue de données + index de recherche (construit une fois, voir catalog_index.py)
+        self.index = get_catalog_index()
+        self.catalog = self.index.catalog
 
-    def analyze(self, context_data, prompt_user):
-        """Décide entre Simulation et IA Réelle"""
-        
-        # CAS 1 : PAS DE CLÉ (Mode Simulation)
-        if not self.api_key:
-            time.sleep(1.5)
-            return f"""
-            ⚠️ **MODE SIMULATION (Clé API manquante)**
-            
-            Analyse pour **{context_data.get('ent_name')}** ({context_data.get('ville')}) :
-            Le système a identifié des risques potentiels basés sur le secteur **{context_data.get('secteur')}**.
-            
-            *Pour activer l'intelligence réelle, entrez votre clé API Gemini dans la barre latérale.*
-            """
-        
-        # CAS 2 : CLÉ PRÉSENTE (Mode Réel)
-        else:
-            try:
-                import google.generativeai as genai
-                genai.configure(api_key=self.api_key)
-                model = genai.GenerativeModel('gemini-1.5-pro')
-                
-                # On prépare les données pour l'IA
-                sources_text = self.catalog.to_string() if not self.catalog.empty else "Catalogue vide."
-                
-                full_prompt = f"""
+    @property
+    def backend(self):
+        if self._backend is None and self.api_key: self._backend = GeminiBackend(self.api_key)
+        return self._backend
+
+    def relevant_sources(self, context_data, prompt_user, k=8):
+        """Top-k sources du catalogue pour ce site (secteur, pays, question) : le prompt reste court"""
+        rows = self.index.for_site(context_data, prompt_user, k=k)
+        cols = [c for c in ['id', 'dataset', 'provider', 'url', 'coverage', 'typical_use'] if c in rows.columns]
+        return rows[cols].to_string(index=False) if not rows.empty else "Aucune source pertinente."
+
+    def build_prompt(self, context_data, prompt_user):
+        # On prépare les données pour l'IA
+        sources_text = self.relevant_sources(context_data, prompt_user) if not self.catalog.empty else "Catalogue vide."
+        return f"""
                 Tu es un Analyste Senior en Risques Hydriques pour un fonds d'investissement.
                 
                 CONTEXTE CLIENT :
-                {json.dumps(context_data, indent=2)}
+                {json.dumps(context_data, indent=2, default=str)}
                 
                 CATALOGUE DE DONNÉES DISPONIBLES (Ne pas inventer, utiliser ces sources) :
                 {sources_text}
@@ -67,13 +55,31 @@ class SmartAnalyst:
                 3. Donne une estimation du risque financier (Low/Medium/High) avec justification.
                 4. Sois professionnel, style Bloomberg Terminal.
                 """
-                
-                with st.spinner("🤖 Gemini analyse vos données et le catalogue..."):
-                    response = model.generate_content(full_prompt)
-                    return response.text
-                    
-            except Exception as e:
-                return f"❌ Erreur de connexion Google Gemini : {str(e)}"
+
+    def analyze_stream(self, context_data, prompt_user):
+        """Générateur de morceaux de texte (st.write_stream). Décide entre Simulation et IA Réelle."""
+        
+        # CAS 1 : PAS DE BACKEND (Mode Simulation)
+        if self.backend is None:
+            yield f"""
+            ⚠️ **MODE SIMULATION (Clé API manquante)**
+            
+            Analyse pour **{context_data.get('ent_name')}** ({context_data.get('ville')}) :
+            Le système a identifié des risques potentiels basés sur le secteur **{context_data.get('secteur')}**.
+            
+            *Pour activer l'intelligence réelle, entrez votre clé API Gemini dans la barre latérale.*
+            """
+            return
+        
+        # CAS 2 : BACKEND PRÉSENT (Mode Réel) : cache puis streaming
+        key = cache_key(self.backend.name, context_data, prompt_user)
+        try:
+            yield from stream_cached(self.backend, self.cache, key, self.build_prompt(context_data, prompt_user))
+        except Exception as e:
+            yield f"\n\n❌ Erreur de connexion au modèle : {str(e)}"
+
+    def analyze(self, context_data, prompt_user):
+        return "".join(self.analyze_stream(context_data, prompt_user))
 
 # --- 2. LA MÉMOIRE (BASE DE DONNÉES) ---
 class DatabaseManager:
@@ -177,12 +183,9 @@ def main():
                 if st.button("Lancer l'Analyse"):
                     context = {"ent_name": client_row['name'], "secteur": client_row['secteur'], "site": site_data['name'], "ville": site_data['ville'], "pays": site_data['pays']}
                     
-                    # APPEL IA
-                    result = brain.analyze(context, user_q)
-                    
-                    # AFFICHAGE
+                    # APPEL IA (affichage au fil de l'eau)
                     st.markdown("---")
-                    st.markdown(result)
+                    result = st.write_stream(brain.analyze_stream(context, user_q))
                     
                     # SAUVEGARDE
                     db.save_audit(site_data['id'], result)
@@ -1,15 +1,17 @@
 import streamlit as st
 import utils
 import pandas as pd
-import folium
-from streamlit_folium import st_folium
-from geopy.geocoders import Nominatim
 
 st.set_page_config(page_title="AquaRisk Manager", page_icon="💧", layout="wide")
 utils.init_session()
 utils.init_db()
 
+if st.query_params.get("diagnostics") == "1": # Page cachée (absente du menu)
+    import diagnostics
+    diagnostics.render(); st.stop()
+
 st.title("💧 AquaRisk Portfolio Manager")
+PAGE_SIZE = 20 # Sites par page (les historiques sont chargés page par page)
 
 # 1. CLIENTS
 with st.sidebar:
@@ -37,16 +39,17 @@ if st.session_state['current_client_id']:
             st.subheader("Ajouter Site")
             sn = st.text_input("Nom Site"); sv = st.text_input("Ville"); sp = st.text_input("Pays")
             if st.button("Ajouter"):
-                try: 
-                    geo = Nominatim(user_agent="AR_75").geocode(f"{sv}, {sp}")
-                    lat, lon = (geo.latitude, geo.longitude) if geo else (0,0)
-                except: lat, lon = 0,0
+                lat, lon, _ = utils.get_gps_coordinates(sv, sp)
+                if lat is None: lat, lon = 0, 0
                 utils.create_site(st.session_state['current_client_id'], sn, sp, sv, lat, lon, "Usine")
                 st.rerun()
         
         with c2:
             st.subheader(f"Sites de {st.session_state['current_client_name']}")
-            df_s = utils.get_sites(st.session_state['current_client_id'])
+            n_sites = utils.count_sites(st.session_state['current_client_id'])
+            n_pages = max(1, -(-n_sites // PAGE_SIZE))
+            page = st.number_input("Page", 1, n_pages, 1) if n_pages > 1 else 1
+            df_s, histories = utils.get_sites_with_history(st.session_state['current_client_id'], limit=PAGE_SIZE, offset=(page - 1) * PAGE_SIZE)
             for i, r in df_s.iterrows():
                 with st.expander(f"📍 {r['name']} ({r['ville']})"):
                     # Bouton Auditer
@@ -56,7 +59,7 @@ if st.session_state['current_client_id']:
                     
                     # Historique & Chargement
                     st.caption("Historique des versions :")
-                    hist = utils.get_site_history(r['id'])
+                    hist = histories.get(int(r['id']), pd.DataFrame(columns=utils.HISTORY_COLS))
                     if not hist.empty:
                         for ih, rh in hist.iterrows():
                             c_date, c_score, c_load = st.columns([2, 1, 1])
@@ -69,6 +72,13 @@ if st.session_state['current_client_id']:
                     else: st.write("Aucun audit passé.")
 
     with t2:
-        # Carte simplifiée
-        st.write("Carte des sites (Fonctionnelle)")
+        # Les onglets s'exécutent tous à chaque rerun : la carte (folium) n'est construite qu'à la demande
+        if st.toggle("Afficher la carte du portefeuille", key="show_portfolio_map"):
+            import portfolio_map
+            cid = st.session_state['current_client_id']
+            geo = utils.get_portfolio_geojson(cid)
+            n_map = len(geo['features'])
+            st.caption(f"{n_map} site(s) géolocalisé(s) sur {utils.count_sites(cid)} — couleur = dernier score global")
+            st.iframe(utils.get_portfolio_map_html(cid), height=portfolio_map.MAP_HEIGHT + 10) # Noms de sites échappés (portfolio_map)
+            st.download_button("⬇️ GeoJSON", portfolio_map.geojson_bytes(geo), f"sites_{cid}.geojson", "application/geo+json")
         
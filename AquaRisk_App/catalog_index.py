@@ -0,0 +1,154 @@
+import os
+import re
+import json
+import math
+import hashlib
+import threading
+import unicodedata
+from collections import Counter
+import pandas as pd
+
+# ==============================================================================
+# INDEX DE RECHERCHE DU CATALOGUE DE SOURCES (BM25, construit une fois, persisté)
+# ==============================================================================
+CATALOG_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "risk_data_sources_catalog")
+CATALOG_INDEX_PATH = 'aquarisk_catalog_index.json'
+CATALOG_TOP_K = 8
+BM25_K1, BM25_B = 1.5, 0.75
+INDEX_FIELDS = {'dataset': 2, 'typical_use': 1, 'notes': 1, 'layer': 1}   # Champ -> poids (répétition des termes)
+
+STOPWORDS = set("""a an and are as at be by de des du for from in is it la le les of on or the to un une et en
+    pour sur dans par au aux ce cette quels quelles quel quelle sont est ou avec via etc sa son ses pour""".split())
+
+# Le catalogue est en anglais, les questions souvent en français : petit glossaire métier
+GLOSSAIRE = {
+    'eau': "water", 'hydrique': "water", 'risque': "risk", 'risques': "risk", 'physique': "physical hazard",
+    'physiques': "physical hazard", 'reglementaire': "regulatory policy", 'reglementaires': "regulatory policy",
+    'inondation': "flood", 'inondations': "flood", 'secheresse': "drought", 'stress': "stress scarcity",
+    'penurie': "scarcity", 'qualite': "quality", 'pollution': "pollution quality", 'climat': "climate",
+    'climatique': "climate", 'incendie': "wildfire fire", 'catastrophe': "disaster", 'financier': "financial",
+    'impact': "impact exposure", 'fournisseur': "supplier supply", 'fournisseurs': "supplier supply",
+    'approvisionnement': "supply chain", 'reputation': "reputation disclosure", 'sanctions': "sanctions",
+    'conflit': "conflict", 'commerce': "trade", 'prix': "prices commodity", 'energie': "energy",
+    'gouvernance': "governance", 'corruption': "corruption", 'biodiversite': "biodiversity nature",
+    'empreinte': "footprint", 'nappe': "groundwater storage", 'souterraine': "groundwater",
+}
+SECTEUR_TERMS = {
+    'agroalimentaire': "agriculture agri food irrigation water withdrawals", 'mines': "mining minerals commodity water",
+    'chimie': "chemical pollution water quality", 'textile': "textile supply chain water footprint",
+    'energie': "energy power", 'data': "data center cooling energy water", 'btp': "construction infrastructure",
+    'automobile': "automotive supply chain trade", 'luxe': "supply chain reputation disclosure",
+    'sante': "health water quality", 'industrie': "industry water withdrawals pollution", 'tech': "data center energy water",
+}
+# Pays -> motifs de la colonne coverage ('global' et 'multi-country' sont toujours acceptés)
+REGIONS = {
+    ('eu', 'euro', 'europe'): ["france", "allemagne", "germany", "espagne", "spain", "italie", "italy", "belgique", "belgium",
+                               "pays-bas", "netherlands", "portugal", "autriche", "austria", "irlande", "ireland", "pologne",
+                               "poland", "suede", "sweden", "danemark", "denmark", "finlande", "finland", "grece", "greece"],
+    ('us',): ["usa", "us", "etats-unis", "united states"],
+    ('uk',): ["uk", "royaume-uni", "united kingdom", "angleterre"],
+}
+
+def _fold(text):
+    return unicodedata.normalize('NFKD', str(text)).encode('ascii', 'ignore').decode().lower()
+
+def tokenize(text):
+    return [w for w in re.findall(r'[a-z0-9]+', _fold(text)) if w not in STOPWORDS and len(w) > 1]
+
+def expand_query(text):
+    """Tokens de la question + traduction des termes métier français"""
+    toks = tokenize(text)
+    return toks + [t for w in toks if w in GLOSSAIRE for t in GLOSSAIRE[w].split()]
+
+def coverage_for_country(pays):
+    """Motifs de couverture pertinents pour un pays (None = pas de filtre)"""
+    if not pays: return None
+    p = _fold(pays).strip()
+    pats = ['global', 'multi-country', p]
+    for region, countries in REGIONS.items():
+        if p in countries: pats += list(region)
+    return pats
+
+class CatalogIndex:
+    """search(query, k, layers, coverage) -> top-k lignes du catalogue. L'index (postings BM25) est recalculé
+    uniquement si le catalogue change (empreinte sha1), sinon relu depuis index_path."""
+    def __init__(self, catalog, index_path=CATALOG_INDEX_PATH):
+        self.catalog = catalog.reset_index(drop=True).fillna("")
+        sig = hashlib.sha1(self.catalog.to_csv(index=False).encode()).hexdigest()
+        data = None
+        if index_path and os.path.exists(index_path):
+            try:
+                with open(index_path) as f: data = json.load(f)
+                if data.get('signature') != sig: data = None
+            except (OSError, ValueError): data = None
+        if data is None:
+            data = self._build(sig)
+            if index_path:
+                tmp = f"{index_path}.tmp"
+                with open(tmp, 'w') as f: json.dump(data, f)
+                os.replace(tmp, index_path)
+        self.postings, self.doc_len = data['postings'], data['doc_len']
+        self.avgdl = (sum(self.doc_len) / len(self.doc_len)) if self.doc_len else 1.0
+        n = len(self.doc_len)
+        self.idf = {t: math.log(1 + (n - len(p) + 0.5) / (len(p) + 0.5)) for t, p in self.postings.items()}
+
+    def _build(self, sig):
+        postings, doc_len = {}, []
+        for i, row in self.catalog.iterrows():
+            toks = [t for f, w in INDEX_FIELDS.items() if f in row for t in tokenize(str(row[f]).replace('_', ' ')) * w]
+            doc_len.append(len(toks))
+            for t, tf in Counter(toks).items(): postings.setdefault(t, []).append([i, tf])
+        return {'signature': sig, 'postings': postings, 'doc_len': doc_len}
+
+    def _allowed(self, layers, coverage):
+        mask = pd.Series(True, index=self.catalog.index)
+        if layers and 'layer' in self.catalog: mask &= self.catalog['layer'].isin(layers)
+        if coverage and 'coverage' in self.catalog:
+            cov = self.catalog['coverage'].map(_fold)
+            mask &= cov.apply(lambda c: any(re.search(rf'\b{re.escape(p)}\b', c) for p in coverage))
+        return mask
+
+    def search(self, query, k=CATALOG_TOP_K, layers=None, coverage=None):
+        """query : texte (FR ou EN). layers : liste de couches ; coverage : motifs (voir coverage_for_country)."""
+        scores = Counter()
+        for t, qtf in Counter(expand_query(query)).items():
+            for i, tf in self.postings.get(t, []):
+                norm = tf + BM25_K1 * (1 - BM25_B + BM25_B * self.doc_len[i] / self.avgdl)
+                scores[i] += qtf * self.idf[t] * tf * (BM25_K1 + 1) / norm
+        allowed = self._allowed(layers, coverage)
+        top = [i for i, _ in sorted(scores.items(), key=lambda x: (-x[1], x[0])) if allowed[i]][:k]
+        return self.catalog.loc[top].assign(score=[round(scores[i], 3) for i in top])
+
+    def for_site(self, context, question="", k=CATALOG_TOP_K, layers=None):
+        """Sources pertinentes pour un site : secteur + pays + question"""
+        secteur = _fold(context.get('secteur') or "").split()
+        terms = SECTEUR_TERMS.get(secteur[0], "") if secteur else ""
+        query = " ".join([terms, str(context.get('pays') or ""), question, "water risk"])
+        return self.search(query, k=k, layers=layers, coverage=coverage_for_country(context.get('pays')))
+
+def load_catalog(path=CATALOG_PATH):
+    try: return pd.read_csv(path)
+    except (OSError, pd.errors.ParserError):
+        # Fallback si le fichier n'est pas là
+        return pd.DataFrame([
+            {"dataset": "WRI Aqueduct", "provider": "WRI", "typical_use": "Stress Hydrique"},
+            {"dataset": "IMF Climate Data", "provider": "IMF", "typical_use": "Risque Macro"}
+        ])
+
+_INDEX = None
+_INDEX_MTIME = None
+_INDEX_LOCK = threading.Lock()
+
+def _mtime(path):
+    try: return os.path.getmtime(path)
+    except OSError: return None
+
+def get_catalog_index():
+    """Index partagé par toutes les sessions ; relu seulement si le fichier catalogue est modifié"""
+    global _INDEX, _INDEX_MTIME
+    mtime = _mtime(CATALOG_PATH)
+    if _INDEX is None or mtime != _INDEX_MTIME:
+        with _INDEX_LOCK:
+            if _INDEX is None or mtime != _INDEX_MTIME:
+                _INDEX, _INDEX_MTIME = CatalogIndex(load_catalog(CATALOG_PATH), index_path=CATALOG_INDEX_PATH), mtime
+    return _INDEX
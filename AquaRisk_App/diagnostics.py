@@ -0,0 +1,33 @@
+import streamlit as st
+import pandas as pd
+import metrics
+
+# ==============================================================================
+# PANNEAU DE DIAGNOSTIC (caché) : Home.py?diagnostics=1
+# ==============================================================================
+def render():
+    st.title("🩺 Diagnostics performance")
+    c1, c2, c3 = st.columns(3)
+    on = c1.toggle("Mesures actives", metrics.is_enabled(), help="Pour tout le process (toutes les sessions)")
+    if on != metrics.is_enabled(): metrics.enable(on); st.rerun()
+    if c2.button("Remettre à zéro"): metrics.reset(); st.rerun()
+    c3.download_button("Export Prometheus", metrics.prometheus_text, file_name="aquarisk_metrics.prom", mime="text/plain")
+
+    snap = metrics.snapshot()
+    st.subheader("Latences")
+    if snap['latency']:
+        st.dataframe(pd.DataFrame([{'appel': n, 'appels': h['count'], 'total (s)': h['sum'], 'moyenne (ms)': h['sum'] / h['count'] * 1000,
+                                    'p50 ≤ (s)': metrics.quantile(h, 0.5), 'p95 ≤ (s)': metrics.quantile(h, 0.95)}
+                                   for n, h in snap['latency'].items()]).sort_values('total (s)', ascending=False),
+                     hide_index=True, use_container_width=True)
+    else: st.caption("Aucune mesure (activer puis naviguer dans l'application).")
+
+    st.subheader("Erreurs")
+    if snap['errors']:
+        st.dataframe(pd.DataFrame([{'appel': n, 'type': t, 'nombre': v} for (n, t), v in snap['errors'].items()]), hide_index=True)
+    else: st.caption("Aucune erreur enregistrée.")
+
+    st.subheader("Caches")
+    if snap['caches']:
+        st.dataframe(pd.DataFrame([{'cache': n, **c} for n, c in snap['caches'].items()]), hide_index=True)
+    if snap['counters']: st.write(snap['counters'])
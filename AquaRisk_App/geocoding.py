@@ -0,0 +1,136 @@
+import sqlite3
+import json
+import time
+import threading
+import unicodedata
+import re
+import requests
+import metrics
+
+# ==============================================================================
+# GEOCODAGE AVEC CACHE PERSISTANT (Nominatim)
+# Utilisé par utils.get_gps_coordinates, app.py, Home.py et aquarisk.py
+# ==============================================================================
+GEOCACHE_DB = 'aquarisk_geocache.db'
+NOMINATIM_URL = "https://nominatim.openstreetmap.org"
+USER_AGENT = "AquaRisk_Geocoder/1.0"
+
+TTL_OK = 180 * 86400     # Une adresse trouvée reste valable 6 mois
+TTL_MISS = 7 * 86400     # Une adresse introuvable est retentée après 7 jours
+NOMINATIM_RATE = 1.0     # Politique d'usage Nominatim : 1 requête / seconde max
+
+def normalize_key(*parts):
+    """'Issy-les-Moulineaux ', 'FRANCE' -> 'issy les moulineaux|france'"""
+    out = []
+    for p in parts:
+        p = unicodedata.normalize('NFKD', str(p or '')).encode('ascii', 'ignore').decode()
+        p = re.sub(r'[^a-z0-9]+', ' ', p.lower()).strip()
+        out.append(p)
+    return '|'.join(out)
+
+class TokenBucket:
+    """Limiteur de débit thread-safe : rate jetons/s, rafale max de burst jetons"""
+    def __init__(self, rate, burst=1):
+        self.rate, self.burst = float(rate), float(burst)
+        self.tokens, self.last = float(burst), time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.burst, self.tokens + (now - self.last) * self.rate)
+                self.last = now
+                if self.tokens >= 1:
+                    self.tokens -= 1; return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+class GeoCache:
+    """Cache SQLite clé -> réponse (found=0 pour le cache négatif)"""
+    def __init__(self, path=GEOCACHE_DB):
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.lock = threading.Lock()
+        with self.lock:
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute('''CREATE TABLE IF NOT EXISTS geocache (key TEXT PRIMARY KEY, found INTEGER, payload TEXT, ts REAL)''')
+            self.conn.commit()
+
+    def get(self, key):
+        with self.lock:
+            return self.conn.execute("SELECT found, payload, ts FROM geocache WHERE key = ?", (key,)).fetchone()
+
+    def put(self, key, payload):
+        with self.lock:
+            self.conn.execute("INSERT OR REPLACE INTO geocache (key, found, payload, ts) VALUES (?, ?, ?, ?)",
+                              (key, int(payload is not None), json.dumps(payload), time.time()))
+            self.conn.commit()
+
+class Geocoder:
+    """Géocodage direct (ville, pays) et inverse (lat, lon) avec cache disque, TTL et cache négatif.
+    base_url est remplaçable (serveur local pour les tests). Seuls les appels réseau consomment le rate_limiter."""
+    def __init__(self, cache_path=GEOCACHE_DB, base_url=NOMINATIM_URL, ttl=TTL_OK, ttl_miss=TTL_MISS, timeout=5, rate_limiter=None):
+        self.cache = GeoCache(cache_path)
+        self.rate_limiter = rate_limiter
+        self.base_url, self.ttl, self.ttl_miss, self.timeout = base_url.rstrip('/'), ttl, ttl_miss, timeout
+        self.session = requests.Session()
+        self.session.headers['User-Agent'] = USER_AGENT
+        self.stats = {'hits': 0, 'negative_hits': 0, 'misses': 0, 'errors': 0}
+
+    def _cached(self, key, fetch, raise_errors=False):
+        row = self.cache.get(key)
+        if row:
+            found, payload, ts = row
+            if time.time() - ts < (self.ttl if found else self.ttl_miss):
+                self.stats['hits' if found else 'negative_hits'] += 1
+                return json.loads(payload)
+        self.stats['misses'] += 1
+        if self.rate_limiter: self.rate_limiter.acquire()
+        try:
+            with metrics.timer("nominatim.fetch"): payload = fetch()
+        except (requests.RequestException, ValueError):
+            # Erreur réseau : on ne met rien en cache, on réessaiera au prochain appel
+            self.stats['errors'] += 1
+            if raise_errors: raise
+            return None
+        self.cache.put(key, payload)
+        return payload
+
+    def _get(self, path, params):
+        r = self.session.get(f"{self.base_url}/{path}", params={**params, 'format': 'json'}, timeout=self.timeout)
+        r.raise_for_status()
+        return r.json()
+
+    def geocode(self, ville, pays, raise_errors=False):
+        """-> (lat, lon, display_name) ou (None, None, None)"""
+        query = f"{ville}, {pays}"
+        def fetch():
+            res = self._get("search", {'q': query, 'limit': 1})
+            if not res: return None
+            return {'lat': float(res[0]['lat']), 'lon': float(res[0]['lon']), 'label': res[0].get('display_name', query)}
+        d = self._cached("fwd:" + normalize_key(ville, pays), fetch, raise_errors)
+        return (d['lat'], d['lon'], d['label']) if d else (None, None, None)
+
+    def reverse(self, lat, lon, language='en', raise_errors=False):
+        """-> dict Nominatim (avec 'address') ou None. Coordonnées arrondies à ~10 m pour la clé."""
+        def fetch():
+            res = self._get("reverse", {'lat': lat, 'lon': lon, 'accept-language': language})
+            return None if not res or 'error' in res else res
+        return self._cached(f"rev:{round(float(lat), 4)},{round(float(lon), 4)}|{language}", fetch, raise_errors)
+
+    def hit_rate(self):
+        total = self.stats['hits'] + self.stats['negative_hits'] + self.stats['misses']
+        return (self.stats['hits'] + self.stats['negative_hits']) / total if total else 0.0
+
+_GEOCODER = None
+_GEOCODER_LOCK = threading.Lock()
+
+def get_geocoder():
+    """Instance partagée par tout le process (toutes les sessions Streamlit)"""
+    global _GEOCODER
+    if _GEOCODER is None:
+        with _GEOCODER_LOCK:
+            if _GEOCODER is None:
+                _GEOCODER = Geocoder(base_url=NOMINATIM_URL, rate_limiter=TokenBucket(NOMINATIM_RATE))
+                metrics.register_cache("geocoder", _GEOCODER.stats, ('hits', 'negative_hits'))
+    return _GEOCODER
@@ -0,0 +1,167 @@
+import io
+import os
+import re
+import multiprocessing
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+import metrics
+
+# ==============================================================================
+# OCR DES LIASSES FISCALES
+# Module importable (et non dans app.py) pour que les workers du pool de process
+# puissent charger run_ocr.
+# ==============================================================================
+
+# Motifs compilés une fois (et non à chaque mot-clé trouvé)
+OCR_PATTERNS = {
+    'ca': ["CHIFFRES D'AFFAIRES", "PRODUITS D'EXPLOITATION", "VENTES"],
+    'res': ["RESULTAT NET", "BENEFICE OU PERTE", "RESULTAT DE L'EXERCICE"],
+    'cap': ["CAPITAUX PROPRES", "SITUATION NETTE"]
+}
+OCR_NUM_RE = re.compile(r'-?\s*(?:\d{1,3}(?:\s\d{3})*|\d+)(?:[\.,]\d+)?')
+OCR_MAX_PAGES = 30
+OCR_WINDOW = 400        # Fenêtre de recherche après le mot clé
+OCR_DOC_CHARS = 10000   # Texte conservé pour st.session_state['doc_content']
+
+YEAR_RE = re.compile(r'(?<!\d)((?:19|20)\d{2})(?!\d)')
+CLOTURE_RE = re.compile(r"(?:CLOS|CLOTURE|EXERCICE)[^\n]{0,40}?(?:\d{1,2}[/.-]\d{1,2}[/.-])?((?:19|20)\d{2})(?!\d)")
+
+def clean_number(text_num):
+    """Nettoie n'importe quel format de nombre (ex: (10 000) -> -10000.0)"""
+    if not isinstance(text_num, str): return 0.0
+    try:
+        clean = text_num.replace(' ', '').replace(')', '').replace('(', '-').replace("'", "").replace('"', "")
+        clean = re.sub(r'[^\d,\.-]', '', clean).replace(',', '.')
+        if clean.count('.') > 1: clean = clean.replace('.', '', clean.count('.') - 1)
+        return float(clean)
+    except: return 0.0
+
+def extract_value(key, window):
+    valid_nums = []
+    for n in OCR_NUM_RE.findall(window):
+        val = clean_number(n)
+        # Filtre intelligent : on ignore les années (1990-2030) et numéros de page
+        if abs(val) > 2050 or (abs(val) > 500 and abs(val) < 1900):
+            valid_nums.append(val)
+    if not valid_nums: return None
+    # Pour le CA on prend le max, pour le reste le premier pertinent
+    return max(valid_nums, key=abs) if key == 'ca' else valid_nums[0]
+
+def _settled(hits):
+    """Valeur définitive d'un champ : tous les mots-clés plus prioritaires ont déjà été vus (sans valeur)"""
+    for h in hits:
+        if h is None: return False      # Mot-clé pas encore rencontré : il peut encore apparaître plus loin
+        if h is not False: return True  # Premier mot-clé (par priorité) qui donne une valeur
+    return True
+
+@metrics.timed("pdfplumber.run_ocr")
+def run_ocr(file_obj):
+    """OCR en flux, page par page. Même résultat qu'une recherche sur le texte complet : pour chaque champ, le mot-clé
+    le plus prioritaire gagne (sa première occurrence), quelle que soit sa page. La lecture s'arrête dès que
+    chaque champ est définitif (aucun mot-clé plus prioritaire ne reste à trouver)."""
+    stats = {'ca': 0.0, 'res': 0.0, 'cap': 0.0, 'found': False}
+    # Par champ et par mot-clé : None = pas encore vu ; False = vu sans chiffre exploitable ; sinon la valeur
+    hits = {key: [None] * len(kws) for key, kws in OCR_PATTERNS.items()}
+    kept, kept_len = [], 0
+    carry = "" # Fin de la page précédente (un mot clé en bas de page a ses chiffres sur la suivante)
+    carry_len = OCR_WINDOW + max(len(kw) for kws in OCR_PATTERNS.values() for kw in kws)
+
+    try:
+        import pdfplumber # Lourd (pdfminer) : chargé au premier OCR seulement
+        with pdfplumber.open(file_obj) as pdf:
+            pages = pdf.pages[:OCR_MAX_PAGES]
+            for i, p in enumerate(pages):
+                txt = (p.extract_text() or "") + "\n"
+                p.close() # Libère le cache de la page
+                if kept_len < OCR_DOC_CHARS:
+                    kept.append(txt[:OCR_DOC_CHARS - kept_len]); kept_len += len(kept[-1])
+
+                buf = carry + txt.upper()
+                last = i == len(pages) - 1
+                for key, kws in OCR_PATTERNS.items():
+                    for r, kw in enumerate(kws):
+                        if hits[key][r] not in (None, False): break # Les mots-clés suivants sont moins prioritaires
+                        if hits[key][r] is False: continue
+                        idx = buf.find(kw)
+                        if idx < 0: continue
+                        # Fenêtre coupée par la fin de page : on réessaiera avec la page suivante
+                        if idx + OCR_WINDOW > len(buf) and not last: continue
+                        val = extract_value(key, buf[idx:idx + OCR_WINDOW])
+                        hits[key][r] = False if val is None else val
+                if all(_settled(h) for h in hits.values()): break # Tout est définitif : inutile de lire la suite
+                carry = buf[-carry_len:]
+    except Exception as e:
+        metrics.error("pdfplumber.run_ocr", e)
+        return stats, f"Erreur OCR: {str(e)}", ""
+
+    for key, h in hits.items():
+        val = next((v for v in h if v not in (None, False)), None)
+        if val is not None: stats[key] = val; stats['found'] = True
+    return stats, "Succès", "".join(kept)
+
+# --- IMPORT EN MASSE ---
+def detect_year(filename, text):
+    """Année de l'exercice : nom du fichier, puis 'exercice clos le ...', puis année la plus citée"""
+    m = YEAR_RE.search(os.path.basename(filename))
+    if m: return int(m.group(1))
+    head = text[:3000].upper()
+    m = CLOTURE_RE.search(head)
+    if m: return int(m.group(1))
+    years = Counter(YEAR_RE.findall(head))
+    return int(years.most_common(1)[0][0]) if years else None
+
+def company_from_filename(filename):
+    stem = os.path.splitext(os.path.basename(filename))[0]
+    stem = YEAR_RE.sub(' ', stem)
+    stem = re.sub(r'(?i)\b(liasse|fiscale|bilan|comptes?|annuels?)\b', ' ', stem)
+    return re.sub(r'[\s_\-]+', ' ', stem).strip().title() or "Inconnue"
+
+def _error_row(name, e):
+    return {'fichier': name, 'entreprise': company_from_filename(name), 'annee': None,
+            'ca': 0.0, 'res': 0.0, 'cap': 0.0, 'statut': "Erreur", 'message': f"{type(e).__name__}: {e}"}
+
+def _ocr_document(name, data):
+    """Worker : un PDF (octets) -> une ligne du tableau. Ne lève jamais d'exception."""
+    try:
+        stats, msg, txt = run_ocr(io.BytesIO(data))
+    except Exception as e:
+        return _error_row(name, e)
+    return {'fichier': name, 'entreprise': company_from_filename(name), 'annee': detect_year(name, txt),
+            'ca': stats['ca'], 'res': stats['res'], 'cap': stats['cap'],
+            'statut': "OK" if stats['found'] else ("Erreur" if msg.startswith("Erreur") else "Non trouvé"), 'message': msg}
+
+def _run_pool(documents, indices, workers, rows, on_done):
+    """Lance les OCR ; renvoie les indices perdus à cause d'un worker mort (pool cassé)"""
+    broken = []
+    # spawn : pas de fork d'un serveur Streamlit multi-threadé
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn')) as ex:
+        futures = {ex.submit(_ocr_document, *documents[i]): i for i in indices}
+        for fut in as_completed(futures):
+            i = futures[fut]
+            try: rows[i] = fut.result()
+            except BrokenProcessPool: broken.append(i); continue
+            except Exception as e: rows[i] = _error_row(documents[i][0], e)
+            on_done()
+    return broken
+
+@metrics.timed("pdfplumber.ingest_liasses")
+def ingest_liasses(documents, max_workers=None, progress=None):
+    """documents : liste de (nom, octets). OCR en parallèle dans un pool de process (pdfplumber est CPU-bound).
+    progress(fait, total) est appelé après chaque document. Renvoie la liste des lignes, dans l'ordre d'entrée.
+    Un document en échec (PDF illisible, worker tué) donne une ligne 'Erreur' sans interrompre le lot."""
+    documents = list(documents)
+    rows = [None] * len(documents)
+    done = [0]
+    def on_done():
+        done[0] += 1
+        if progress: progress(done[0], len(documents))
+
+    workers = max_workers or min(len(documents), os.cpu_count() or 1)
+    broken = _run_pool(documents, range(len(documents)), workers, rows, on_done) if documents else []
+    # Pool cassé : on isole les documents restants un par un pour trouver le coupable
+    for i in broken:
+        if _run_pool(documents, [i], 1, rows, on_done):
+            rows[i] = _error_row(documents[i][0], BrokenProcessPool("le worker s'est arrêté sur ce document"))
+            on_done()
+    return rows
@@ -0,0 +1,102 @@
+import re
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from abc import ABC, abstractmethod
+import metrics
+
+# ==============================================================================
+# BACKENDS LLM (Gemini ou faux local) + CACHE DES RÉPONSES + STREAMING
+# ==============================================================================
+LLM_CACHE_DB = 'aquarisk_llm_cache.db'
+LLM_TTL = 7 * 86400          # Une analyse reste valable une semaine pour le même site / la même question
+GEMINI_MODEL = 'gemini-1.5-pro'
+
+class ModelBackend(ABC):
+    """Interface : stream(prompt) -> itérateur de morceaux de texte. name entre dans la clé de cache."""
+    name = "base"
+    @abstractmethod
+    def stream(self, prompt): ...
+
+class GeminiBackend(ModelBackend):
+    def __init__(self, api_key, model=GEMINI_MODEL):
+        import google.generativeai as genai # Import lourd : seulement si une clé est fournie
+        genai.configure(api_key=api_key)
+        self.name, self.model = model, genai.GenerativeModel(model)
+
+    def stream(self, prompt):
+        for chunk in self.model.generate_content(prompt, stream=True):
+            if chunk.text: yield chunk.text
+
+class FakeBackend(ModelBackend):
+    """Backend local déterministe (tests, benchmarks, démo hors-ligne) : renvoie `text` (ou un écho du prompt) mot à mot"""
+    name = "fake"
+    def __init__(self, text=None, delay=0.0):
+        self.text, self.delay, self.calls = text, delay, 0
+
+    def stream(self, prompt):
+        self.calls += 1
+        text = self.text or f"Analyse simulée ({len(prompt)} caractères de contexte)."
+        for w in re.findall(r'\S+\s*', text):
+            if self.delay: time.sleep(self.delay)
+            yield w
+
+def _norm(v):
+    if isinstance(v, dict): return {str(k): _norm(x) for k, x in sorted(v.items())}
+    if isinstance(v, (list, tuple)): return [_norm(x) for x in v]
+    if isinstance(v, str): return re.sub(r'\s+', ' ', v).strip().lower()
+    return v
+
+def cache_key(model, context, prompt):
+    """Même site + même question (à la casse et aux espaces près) -> même clé"""
+    payload = json.dumps([model, _norm(context), _norm(prompt)], sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+class ResponseCache:
+    def __init__(self, path=LLM_CACHE_DB, ttl=LLM_TTL):
+        self.ttl = ttl
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0}
+        with self.lock:
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute('''CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, model TEXT, response TEXT, ts REAL)''')
+            self.conn.commit()
+
+    def get(self, key):
+        with self.lock:
+            row = self.conn.execute("SELECT response, ts FROM responses WHERE key = ?", (key,)).fetchone()
+        hit = row is not None and time.time() - row[1] < self.ttl
+        self.stats['hits' if hit else 'misses'] += 1
+        return row[0] if hit else None
+
+    def put(self, key, model, response):
+        with self.lock:
+            self.conn.execute("INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?)", (key, model, response, time.time()))
+            self.conn.commit()
+
+def stream_cached(backend, cache, key, prompt):
+    """Réponse en cache servie d'un bloc, sinon streamée depuis le backend puis mise en cache.
+    Une réponse interrompue (exception) n'est pas mise en cache."""
+    cached = cache.get(key) if cache else None
+    if cached is not None:
+        yield cached; return
+    parts = []
+    for chunk in backend.stream(prompt):
+        parts.append(chunk)
+        yield chunk
+    if cache: cache.put(key, backend.name, "".join(parts))
+
+_CACHE = None
+_CACHE_LOCK = threading.Lock()
+
+def get_response_cache():
+    global _CACHE
+    if _CACHE is None:
+        with _CACHE_LOCK:
+            if _CACHE is None:
+                _CACHE = ResponseCache(LLM_CACHE_DB)
+                metrics.register_cache("llm_responses", _CACHE.stats)
+    return _CACHE
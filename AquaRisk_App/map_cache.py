@@ -0,0 +1,104 @@
+import io
+import os
+import hashlib
+import threading
+import tempfile
+import requests
+from staticmap import StaticMap, CircleMarker
+import metrics
+
+# ==============================================================================
+# CACHE DISQUE DES TUILES ET DES VIGNETTES DE CARTE (rapports PDF)
+# ==============================================================================
+MAP_CACHE_DIR = os.path.join(tempfile.gettempdir(), 'aquarisk_map_cache')
+TILE_URL = "https://a.tile.openstreetmap.org/{z}/{x}/{y}.png"   # Remplaçable (serveur local en test)
+TILE_CACHE_MB = 200
+THUMB_CACHE_MB = 50
+
+class DiskLRU:
+    """Cache clé -> fichier, borné en taille. L'ordre LRU suit le mtime (rafraîchi à chaque lecture)."""
+    def __init__(self, directory, max_bytes, suffix=".png"):
+        self.dir, self.max_bytes, self.suffix = directory, max_bytes, suffix
+        self.lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0, 'evictions': 0}
+        os.makedirs(directory, exist_ok=True)
+        self.size = sum(e.stat().st_size for e in os.scandir(directory) if e.is_file())
+
+    def path(self, key):
+        return os.path.join(self.dir, hashlib.sha1(repr(key).encode()).hexdigest() + self.suffix)
+
+    def get(self, key):
+        """Chemin du fichier en cache, ou None"""
+        p = self.path(key)
+        try: os.utime(p)
+        except OSError:
+            self.stats['misses'] += 1; return None
+        self.stats['hits'] += 1
+        return p
+
+    def put(self, key, data):
+        p = self.path(key)
+        tmp = f"{p}.{threading.get_ident()}.tmp"
+        with open(tmp, 'wb') as f: f.write(data)
+        with self.lock:
+            old = os.path.getsize(p) if os.path.exists(p) else 0
+            os.replace(tmp, p) # Écriture atomique : un lecteur ne voit jamais un fichier partiel
+            self.size += len(data) - old
+            if self.size > self.max_bytes: self._evict()
+        return p
+
+    def _evict(self):
+        files = sorted((e for e in os.scandir(self.dir) if e.is_file() and e.name.endswith(self.suffix)), key=lambda e: e.stat().st_mtime)
+        for e in files:
+            if self.size <= self.max_bytes * 0.9: break # Marge pour ne pas évincer à chaque écriture
+            try:
+                sz = e.stat().st_size; os.remove(e.path)
+                self.size -= sz; self.stats['evictions'] += 1
+            except OSError: pass
+
+class CachedStaticMap(StaticMap):
+    """StaticMap dont les tuiles passent par le cache disque et une session HTTP partagée"""
+    def __init__(self, width, height, tile_cache, session, **kwargs):
+        super().__init__(width, height, **kwargs)
+        self.tile_cache, self.session = tile_cache, session
+
+    def get(self, url, **kwargs):
+        p = self.tile_cache.get(url)
+        if p:
+            with open(p, 'rb') as f: return 200, f.read()
+        with metrics.timer("osm_tiles.get"): res = self.session.get(url, **kwargs)
+        if res.status_code == 200: self.tile_cache.put(url, res.content)
+        return res.status_code, res.content
+
+class MapRenderer:
+    """Vignettes de site (lat, lon, zoom, taille) rendues une fois, servies ensuite depuis le disque"""
+    def __init__(self, cache_dir=MAP_CACHE_DIR, tile_url=TILE_URL, tile_mb=TILE_CACHE_MB, thumb_mb=THUMB_CACHE_MB):
+        self.tile_url = tile_url
+        self.tiles = DiskLRU(os.path.join(cache_dir, 'tiles'), tile_mb * 1024 * 1024)
+        self.thumbs = DiskLRU(os.path.join(cache_dir, 'thumbs'), thumb_mb * 1024 * 1024)
+        self.session = requests.Session()
+        self.session.headers['User-Agent'] = "AquaRisk_Pro_v80"
+
+    def thumbnail(self, lat, lon, zoom=10, size=(400, 300)):
+        """Chemin PNG de la vignette (ne pas supprimer : c'est le fichier du cache)"""
+        key = (round(float(lat), 5), round(float(lon), 5), zoom, tuple(size), self.tile_url)
+        p = self.thumbs.get(key)
+        if p: return p
+        m = CachedStaticMap(size[0], size[1], self.tiles, self.session, url_template=self.tile_url, tile_request_timeout=10)
+        m.add_marker(CircleMarker((lon, lat), 'red', 10))
+        img = m.render(zoom=zoom)
+        buf = io.BytesIO(); img.save(buf, format='PNG')
+        return self.thumbs.put(key, buf.getvalue())
+
+_RENDERER = None
+_RENDERER_LOCK = threading.Lock()
+
+def get_renderer():
+    global _RENDERER
+    if _RENDERER is None:
+        with _RENDERER_LOCK:
+            if _RENDERER is None:
+                _RENDERER = MapRenderer(tile_url=TILE_URL)
+                metrics.register_cache("map_tiles", _RENDERER.tiles.stats)
+                metrics.register_cache("map_thumbs", _RENDERER.thumbs.stats)
+    return _RENDERER
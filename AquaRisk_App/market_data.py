@@ -0,0 +1,147 @@
+import json
+import time
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from datetime import date
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import pandas as pd
+import metrics
+
+# ==============================================================================
+# DONNÉES DE MARCHÉ : capitalisations en lot, cache disque par jour de bourse
+# ==============================================================================
+MARKET_CACHE_DB = 'aquarisk_market.db'
+PROFILE_TTL = 30 * 86400      # Nom, secteur, nombre d'actions : quasi statiques
+PROFILE_WORKERS = 8
+QUOTE_COLS = ['ticker', 'market_cap', 'price', 'currency', 'name', 'sector', 'error']
+
+def trading_day(d=None):
+    """Dernier jour ouvré (le cache d'un samedi est celui du vendredi)"""
+    return str(np.busday_offset(np.datetime64(d or date.today(), 'D'), 0, roll='backward'))
+
+class MarketDataProvider(ABC):
+    """Interface : un fournisseur renvoie, pour chaque ticker, soit un dict de champs soit une erreur.
+    prices(tickers) -> {ticker: {'price', 'currency'} | {'error'}}
+    profiles(tickers) -> {ticker: {'shares', 'name', 'sector', 'currency'} | {'error'}}"""
+    @abstractmethod
+    def prices(self, tickers): ...
+    @abstractmethod
+    def profiles(self, tickers): ...
+
+class YahooProvider(MarketDataProvider):
+    def prices(self, tickers):
+        import yfinance as yf
+        # Une seule requête pour tous les tickers (au lieu d'un Ticker.info par ticker)
+        df = yf.download(list(tickers), period="5d", group_by='ticker', progress=False, auto_adjust=False, threads=True)
+        out = {}
+        for t in tickers:
+            try:
+                close = (df[t] if isinstance(df.columns, pd.MultiIndex) else df)['Close'].dropna()
+                out[t] = {'price': float(close.iloc[-1])} if len(close) else {'error': "Aucune cotation (ticker inconnu ?)"}
+            except KeyError: out[t] = {'error': "Ticker absent de la réponse Yahoo"}
+        return out
+
+    def profiles(self, tickers):
+        import yfinance as yf
+        def one(t):
+            try:
+                tk = yf.Ticker(t); fi = tk.fast_info
+                shares = fi['shares']
+                if not shares: return t, {'error': "Nombre d'actions indisponible"}
+                try: meta = tk.get_history_metadata()
+                except Exception: meta = {}
+                # Le secteur n'existe que dans Ticker.info (appel lourd) : non récupéré ici
+                return t, {'shares': float(shares), 'currency': fi['currency'],
+                           'name': meta.get('shortName') or meta.get('longName') or t, 'sector': None}
+            except Exception as e: return t, {'error': f"{type(e).__name__}: {e}"}
+        with ThreadPoolExecutor(max_workers=PROFILE_WORKERS) as ex:
+            return dict(ex.map(one, tickers))
+
+class FixtureProvider(MarketDataProvider):
+    """Fournisseur local (tests, démo hors-ligne) : {ticker: {'price', 'shares', 'name', 'sector', 'currency'}}"""
+    def __init__(self, data):
+        self.data = data
+        self.calls = {'prices': 0, 'profiles': 0}
+
+    def prices(self, tickers):
+        self.calls['prices'] += 1
+        return {t: {'price': self.data[t]['price']} if t in self.data else {'error': "Ticker inconnu"} for t in tickers}
+
+    def profiles(self, tickers):
+        self.calls['profiles'] += 1
+        keys = ['shares', 'name', 'sector', 'currency']
+        return {t: {k: self.data[t].get(k) for k in keys} if t in self.data else {'error': "Ticker inconnu"} for t in tickers}
+
+class MarketData:
+    """quotes(tickers) -> DataFrame (une ligne par ticker, colonne 'error' renseignée en cas d'échec)"""
+    def __init__(self, provider=None, cache_path=MARKET_CACHE_DB):
+        self.provider = provider or YahooProvider()
+        self.conn = sqlite3.connect(cache_path, check_same_thread=False)
+        self.lock = threading.Lock()
+        with self.lock:
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute('''CREATE TABLE IF NOT EXISTS prices (ticker TEXT, day TEXT, payload TEXT, PRIMARY KEY (ticker, day))''')
+            self.conn.execute('''CREATE TABLE IF NOT EXISTS profiles (ticker TEXT PRIMARY KEY, payload TEXT, ts REAL)''')
+            self.conn.commit()
+
+    def _cached(self, table, tickers, where, params):
+        with self.lock:
+            q = f"SELECT ticker, payload FROM {table} WHERE ticker IN ({','.join('?' * len(tickers))}) AND {where}"
+            return {t: json.loads(p) for t, p in self.conn.execute(q, (*tickers, *params))}
+
+    def _store(self, table, rows):
+        with self.lock:
+            self.conn.executemany(f"INSERT OR REPLACE INTO {table} VALUES (?, ?, ?)", rows)
+            self.conn.commit()
+
+    def quotes(self, tickers):
+        tickers = list(dict.fromkeys(t.strip().upper() for t in tickers if t and t.strip()))
+        if not tickers: return pd.DataFrame(columns=QUOTE_COLS)
+        day = trading_day()
+
+        prices = self._cached('prices', tickers, "day = ?", (day,))
+        todo = [t for t in tickers if t not in prices]
+        if todo:
+            try:
+                with metrics.timer("yahoo.prices"): fresh = self.provider.prices(todo)
+            except Exception as e: fresh = {t: {'error': f"{type(e).__name__}: {e}"} for t in todo}
+            # Seules les cotations valides sont mises en cache : une erreur sera retentée
+            self._store('prices', [(t, day, json.dumps(v)) for t, v in fresh.items() if 'error' not in v])
+            prices.update(fresh)
+
+        profiles = self._cached('profiles', tickers, "ts > ?", (time.time() - PROFILE_TTL,))
+        todo = [t for t in tickers if t not in profiles and 'error' not in prices.get(t, {})]
+        if todo:
+            try:
+                with metrics.timer("yahoo.profiles"): fresh = self.provider.profiles(todo)
+            except Exception as e: fresh = {t: {'error': f"{type(e).__name__}: {e}"} for t in todo}
+            self._store('profiles', [(t, json.dumps(v), time.time()) for t, v in fresh.items() if 'error' not in v])
+            profiles.update(fresh)
+
+        rows = []
+        for t in tickers:
+            p, f = prices.get(t, {}), profiles.get(t, {})
+            err = p.get('error') or f.get('error')
+            mcap = p['price'] * f['shares'] if not err and f.get('shares') else None
+            if not err and mcap is None: err = "Nombre d'actions indisponible"
+            rows.append({'ticker': t, 'market_cap': mcap, 'price': p.get('price'), 'currency': f.get('currency'),
+                         'name': f.get('name') or t, 'sector': f.get('sector') or "N/A", 'error': err})
+        df = pd.DataFrame(rows, columns=QUOTE_COLS)
+        # Colonnes texte en object avec None : sous pandas 3 (dtype str), un succès vaudrait NaN, qui est vrai
+        for c in ('currency', 'error'): df[c] = df[c].astype(object).where(df[c].notna(), None)
+        return df
+
+    def quote(self, ticker):
+        return self.quotes([ticker]).iloc[0].to_dict()
+
+_MARKET = None
+_MARKET_LOCK = threading.Lock()
+
+def get_market_data():
+    global _MARKET
+    if _MARKET is None:
+        with _MARKET_LOCK:
+            if _MARKET is None: _MARKET = MarketData()
+    return _MARKET
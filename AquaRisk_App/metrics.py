@@ -0,0 +1,126 @@
+import os
+import time
+import bisect
+import threading
+import functools
+from contextlib import contextmanager
+
+# ==============================================================================
+# MÉTRIQUES : latences (histogrammes), erreurs par type, taux de succès des caches
+# Désactivé par défaut (AQUARISK_METRICS=1 pour l'activer au démarrage) : un appel
+# instrumenté ne coûte alors qu'un test de booléen.
+# ==============================================================================
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0) # Secondes
+PREFIX = "aquarisk"
+
+class Registry:
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.lock = threading.Lock()
+        self.caches = {} # nom -> fonction () -> (hits, misses)
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.hist = {}     # nom -> [compteurs par bucket (+inf en dernier), somme, nombre]
+            self.errors = {}   # (nom, type d'exception) -> nombre
+            self.counters = {} # nom -> valeur
+
+    def observe(self, name, seconds):
+        with self.lock:
+            h = self.hist.get(name)
+            if h is None: h = self.hist[name] = [[0] * (len(BUCKETS) + 1), 0.0, 0]
+            h[0][bisect.bisect_left(BUCKETS, seconds)] += 1
+            h[1] += seconds; h[2] += 1
+
+    def error(self, name, exc):
+        if not self.enabled: return
+        key = (name, type(exc).__name__)
+        with self.lock: self.errors[key] = self.errors.get(key, 0) + 1
+
+    def inc(self, name, n=1):
+        if not self.enabled: return
+        with self.lock: self.counters[name] = self.counters.get(name, 0) + n
+
+    def cache_rates(self):
+        out = {}
+        for name, fn in list(self.caches.items()):
+            try: hits, misses = fn()
+            except Exception: continue
+            total = hits + misses
+            out[name] = {'hits': hits, 'misses': misses, 'hit_rate': hits / total if total else None}
+        return out
+
+REGISTRY = Registry(enabled=os.environ.get("AQUARISK_METRICS", "") == "1")
+
+def enable(on=True): REGISTRY.enabled = on
+def is_enabled(): return REGISTRY.enabled
+def reset(): REGISTRY.reset()
+def error(name, exc): REGISTRY.error(name, exc)
+def inc(name, n=1): REGISTRY.inc(name, n)
+
+def register_cache(name, stats, hit_keys=('hits',), miss_keys=('misses',)):
+    """Expose le dict `stats` d'un cache (lu seulement à l'export, aucun coût sur le chemin chaud)"""
+    REGISTRY.caches[name] = lambda: (sum(stats.get(k, 0) for k in hit_keys), sum(stats.get(k, 0) for k in miss_keys))
+
+def timed(name):
+    """Décorateur : latence de chaque appel + erreurs par type (l'exception est relancée)"""
+    def deco(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not REGISTRY.enabled: return fn(*args, **kwargs)
+            t = time.perf_counter()
+            try: return fn(*args, **kwargs)
+            except Exception as e:
+                REGISTRY.error(name, e); raise
+            finally: REGISTRY.observe(name, time.perf_counter() - t)
+        return wrapper
+    return deco
+
+@contextmanager
+def timer(name):
+    if not REGISTRY.enabled:
+        yield; return
+    t = time.perf_counter()
+    try: yield
+    except Exception as e:
+        REGISTRY.error(name, e); raise
+    finally: REGISTRY.observe(name, time.perf_counter() - t)
+
+def snapshot():
+    """État courant -> dict (panneau de diagnostic)"""
+    with REGISTRY.lock:
+        hist = {n: {'count': h[2], 'sum': h[1], 'buckets': list(h[0])} for n, h in REGISTRY.hist.items()}
+        errors, counters = dict(REGISTRY.errors), dict(REGISTRY.counters)
+    return {'latency': hist, 'errors': errors, 'counters': counters, 'caches': REGISTRY.cache_rates()}
+
+def quantile(h, q):
+    """Quantile approché (borne supérieure du bucket) d'un histogramme de snapshot()"""
+    target, acc = q * h['count'], 0
+    for le, n in zip(BUCKETS + (float('inf'),), h['buckets']):
+        acc += n
+        if acc >= target and h['count']: return le
+    return None
+
+def _esc(v): return str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def prometheus_text():
+    """Export au format texte Prometheus (exposition 0.0.4)"""
+    s = snapshot()
+    lines = [f"# HELP {PREFIX}_call_duration_seconds Latence des appels instrumentés",
+             f"# TYPE {PREFIX}_call_duration_seconds histogram"]
+    for name, h in sorted(s['latency'].items()):
+        acc = 0
+        for le, n in zip(BUCKETS + (float('inf'),), h['buckets']):
+            acc += n
+            lines.append(f'{PREFIX}_call_duration_seconds_bucket{{name="{_esc(name)}",le="{"+Inf" if le == float("inf") else le}"}} {acc}')
+        lines.append(f'{PREFIX}_call_duration_seconds_sum{{name="{_esc(name)}"}} {h["sum"]:.6f}')
+        lines.append(f'{PREFIX}_call_duration_seconds_count{{name="{_esc(name)}"}} {h["count"]}')
+    lines += [f"# HELP {PREFIX}_errors_total Erreurs par appel et type d'exception", f"# TYPE {PREFIX}_errors_total counter"]
+    lines += [f'{PREFIX}_errors_total{{name="{_esc(n)}",type="{_esc(t)}"}} {v}' for (n, t), v in sorted(s['errors'].items())]
+    lines += [f"# TYPE {PREFIX}_events_total counter"]
+    lines += [f'{PREFIX}_events_total{{name="{_esc(n)}"}} {v}' for n, v in sorted(s['counters'].items())]
+    for kind in ('hits', 'misses'):
+        lines.append(f"# TYPE {PREFIX}_cache_{kind}_total counter")
+        lines += [f'{PREFIX}_cache_{kind}_total{{cache="{_esc(n)}"}} {c[kind]}' for n, c in sorted(s['caches'].items())]
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,79 @@
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import requests
+import metrics
+
+# ==============================================================================
+# VEILLE GOOGLE NEWS : cache par sujet + requêtes conditionnelles (ETag / Last-Modified)
+# ==============================================================================
+NEWS_URL = "https://news.google.com/rss/search"   # Remplaçable (flux local en test)
+NEWS_PARAMS = {'hl': "fr", 'gl': "FR", 'ceid': "FR:fr"}
+NEWS_TTL = 15 * 60       # Un sujet n'est pas re-demandé avant 15 min
+NEWS_MAX_ITEMS = 10
+NEWS_WORKERS = 8         # Flux téléchargés en parallèle au maximum
+
+class NewsWatch:
+    """fetch(topic) -> [{'title', 'link', 'date'}]. Après expiration du TTL, le flux est redemandé
+    avec If-None-Match / If-Modified-Since : un flux inchangé coûte un simple 304."""
+    def __init__(self, base_url=NEWS_URL, ttl=NEWS_TTL, timeout=6, max_workers=NEWS_WORKERS):
+        self.base_url, self.ttl, self.timeout, self.max_workers = base_url, ttl, timeout, max_workers
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=max_workers)
+        self.session.mount("http://", adapter); self.session.mount("https://", adapter)
+        self.session.headers['User-Agent'] = "AquaRisk_Pro_v80"
+        self._cache = {} # topic -> {'items', 'etag', 'modified', 'ts'}
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'not_modified': 0, 'downloads': 0, 'errors': 0}
+
+    def fetch(self, topic):
+        key = topic.strip().lower()
+        with self._lock: entry = self._cache.get(key)
+        if entry and time.time() - entry['ts'] < self.ttl:
+            self.stats['hits'] += 1
+            return entry['items']
+
+        headers = {}
+        if entry and entry.get('etag'): headers['If-None-Match'] = entry['etag']
+        if entry and entry.get('modified'): headers['If-Modified-Since'] = entry['modified']
+        try:
+            with metrics.timer("google_news.get"):
+                r = self.session.get(self.base_url, params={'q': topic, **NEWS_PARAMS}, headers=headers, timeout=self.timeout)
+            if r.status_code == 304 and entry:
+                self.stats['not_modified'] += 1
+                items = entry['items']
+            else:
+                r.raise_for_status()
+                self.stats['downloads'] += 1
+                import feedparser # Chargé au premier téléchargement réel (pas pour un 304 ni un hit)
+                feed = feedparser.parse(r.content)
+                items = [{"title": e.title, "link": e.link, "date": e.published if 'published' in e else "Récent"}
+                         for e in feed.entries[:NEWS_MAX_ITEMS]]
+            with self._lock:
+                self._cache[key] = {'items': items, 'ts': time.time(),
+                                    'etag': r.headers.get('ETag') or (entry or {}).get('etag'),
+                                    'modified': r.headers.get('Last-Modified') or (entry or {}).get('modified')}
+            return items
+        except (requests.RequestException, AttributeError) as e:
+            # Panne réseau : on sert la dernière version connue plutôt que rien
+            self.stats['errors'] += 1; metrics.error("google_news", e)
+            return entry['items'] if entry else []
+
+    def fetch_many(self, topics):
+        """Plusieurs sujets en parallèle (max_workers connexions) -> {topic: items}"""
+        topics = list(dict.fromkeys(topics))
+        with ThreadPoolExecutor(max_workers=self.max_workers) as ex:
+            return dict(zip(topics, ex.map(self.fetch, topics)))
+
+_WATCH = None
+_WATCH_LOCK = threading.Lock()
+
+def get_news_watch():
+    """Instance partagée par tout le process (toutes les sessions Streamlit)"""
+    global _WATCH
+    if _WATCH is None:
+        with _WATCH_LOCK:
+            if _WATCH is None:
+                _WATCH = NewsWatch(base_url=NEWS_URL)
+                metrics.register_cache("google_news", _WATCH.stats, ('hits', 'not_modified'), ('downloads',))
+    return _WATCH
@@ -27,6 +27,12 @@ if type_ent == "PME / ETI":
                     st.success(f"Données importées pour {nom}")
                     st.rerun()
                 else: st.error(nom)
+            with st.expander("Import en masse (liste de SIREN)"):
+                lst = st.text_area("Un SIREN ou nom par ligne")
+                if st.button("Importer la liste") and lst.strip():
+                    st.session_state['pappers_bulk'] = utils.get_pappers_bulk(lst.splitlines(), api_key)
+                if st.session_state.get('pappers_bulk') is not None:
+                    st.dataframe(st.session_state['pappers_bulk'], hide_index=True)
         
         with c2:
             st.markdown("##### Saisie Manuelle")
@@ -74,11 +80,13 @@ elif type_ent == "Start-up":
 elif type_ent == "Grande Entreprise (Bourse)":
     tick = st.text_input("Ticker Yahoo (ex: AI.PA)", "AI.PA")
     if st.button("Chercher"):
-        v, n, s = utils.get_yahoo_data(tick)
-        st.session_state['valo_finale'] = v
-        st.session_state['ent_name'] = n
-        st.session_state['secteur'] = s
-        st.rerun()
+        v, n, s, err = utils.get_yahoo_data(tick)
+        if err: st.error(f"{tick} : {err}")
+        else:
+            st.session_state['valo_finale'] = v
+            st.session_state['ent_name'] = n
+            if s in utils.SECTEURS: st.session_state['secteur'] = s
+            st.rerun()
 
 st.divider()
 st.metric("VALORISATION RETENUE POUR L'AUDIT", f"{st.session_state['valo_finale']:,.0f} €")
@@ -1,5 +1,25 @@
 import streamlit as st
 import utils
+import os
+import tempfile
+
+def new_temp(suffix):
+    """Fichier temporaire unique (deux sessions qui exportent en même temps ne s'écrasent pas)"""
+    fd, path = tempfile.mkstemp(prefix="aquarisk_", suffix=suffix); os.close(fd)
+    return path
+
+def build_to_temp(suffix, build):
+    """build(chemin) écrit un fichier ; renvoie son contenu et supprime le fichier."""
+    path = new_temp(suffix)
+    try:
+        build(path)
+        with open(path, 'rb') as f: return f.read()
+    finally: os.remove(path)
+
+def drop_report():
+    """Le rapport du portefeuille reste sur disque (pas en session) jusqu'au téléchargement ou au suivant"""
+    report = st.session_state.pop('portfolio_report', None)
+    if report and os.path.exists(report[1]): os.remove(report[1])
 
 utils.init_session()
 st.title("📑 Rapport Final")
@@ -16,6 +36,39 @@ with c2:
     if st.button("Exporter Excel"):
         xls = utils.generate_excel(st.session_state)
         st.download_button("📊 Télécharger Excel", data=xls, file_name="Data.xlsx")
+    if st.button("Exporter tout le portefeuille (Excel)"):
+        with st.spinner("Export en cours..."):
+            xls_all = build_to_temp(".xlsx", utils.export_portfolio_excel)
+        st.download_button("📊 Télécharger le portefeuille", xls_all, file_name="Portefeuille_AquaRisk.xlsx")
+
+st.divider()
+st.markdown("### 📚 Rapports du portefeuille")
+if st.session_state.get('current_client_id'):
+    fmt = st.radio("Format", ["ZIP (un PDF par site)", "Livre client (PDF unique)"], horizontal=True)
+    if st.button(f"Générer les rapports de {st.session_state['current_client_name']}"):
+        book, cid = fmt.startswith("Livre"), st.session_state['current_client_id']
+        ext = 'pdf' if book else 'zip'
+        drop_report()
+        bar = st.progress(0.0, text="Génération...")
+        path = utils.generate_portfolio_reports(cid, new_temp(f".{ext}"), mode="book" if book else "zip",
+                                                progress=lambda d, t: bar.progress(d / t, text=f"{d}/{t} sites"))
+        st.session_state['portfolio_report'] = (f"aquarisk_client_{cid}.{ext}", path) # Chemin propre à la session
+    report = st.session_state.get('portfolio_report')
+    if report and os.path.exists(report[1]):
+        name, path = report
+        with open(path, 'rb') as f:
+            st.download_button("📥 Télécharger", f, file_name=name, on_click=drop_report,
+                               mime="application/pdf" if name.endswith(".pdf") else "application/zip")
+else: st.caption("Sélectionnez un client dans Home.")
+
+if st.session_state.get('current_client_id'):
+    st.markdown("### 📈 Synthèse du portefeuille")
+    summary = utils.get_portfolio_summary(st.session_state['current_client_id'])
+    if summary.empty: st.caption("Aucun audit enregistré.")
+    else:
+        st.dataframe(summary, hide_index=True, use_container_width=True)
+        trend = utils.get_score_trend(st.session_state['current_client_id'])
+        st.line_chart(trend.set_index('periode')[['score_moyen', 'pression_legale', 'risque_image']])
 
 st.markdown("### Sources")
 for n in st.session_state.get('news', []):
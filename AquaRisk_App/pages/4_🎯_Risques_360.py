@@ -15,22 +15,20 @@ with t_score:
     c1, c2 = st.columns([1, 2])
     with c1:
         st.subheader("Paramètres")
-        p_leg = st.slider("Pression Légale", 0, 100, 50)
-        p_img = st.slider("Réputation", 0, 100, 50)
+        # Valeur initiale = session (init_session / audit rechargé) ; le slider écrit directement dans sa clé
+        p_leg = st.slider("Pression Légale", 0, 100, key="pression_legale")
+        p_img = st.slider("Réputation", 0, 100, key="risque_image")
         p_sup = st.slider("Dépendance Fournisseurs", 0, 100, 30)
         
-        # Sauvegarde inputs
-        st.session_state['part_fournisseur_risk'] = p_sup
+        # Sauvegarde inputs (paramètres enregistrés avec l'audit)
+        st.session_state.update({'part_fournisseur_risk': p_sup})
         params = {'pression_legale': p_leg, 'risque_image': p_img}
 
     with c2:
         if st.button("⚡ CALCULER LE RISQUE", type="primary"):
-            sg, s1, s2, s3, s4 = utils.calculate_bloomberg_score(st.session_state, params)
-            st.session_state.update({
-                'score_global': sg, 'score_physique': s1, 
-                'score_reglementaire': s2, 'score_reputation': s3, 'score_resilience': s4
-            })
-            st.session_state['var_amount'] = utils.calculate_financial_impact(st.session_state, sg)
+            site = pd.DataFrame([{k: st.session_state[k] for k in utils.SCORING_INPUTS}])
+            res = utils.calculate_portfolio_scores(site, params).iloc[0]
+            st.session_state.update({k: float(v) for k, v in res.items()})
             st.rerun()
 
         # Résultats
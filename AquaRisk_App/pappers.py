@@ -0,0 +1,131 @@
+import re
+import json
+import time
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import metrics
+
+# ==============================================================================
+# CLIENT PAPPERS : session poolée, timeouts, retry/backoff, cache persistant par SIREN
+# ==============================================================================
+PAPPERS_URL = "https://api.pappers.fr/v2"      # Remplaçable (serveur local en test)
+PAPPERS_CACHE_DB = 'aquarisk_pappers.db'
+TTL_SEARCH = 30 * 86400     # Nom -> SIREN : stable
+TTL_COMPANY = 30 * 86400    # Comptes : publiés une fois par an, un mois de validité suffit
+PAPPERS_WORKERS = 4         # Import en masse : requêtes simultanées (quota payant)
+SIREN_RE = re.compile(r'^\d{9}$')
+
+class PappersError(Exception):
+    pass
+
+class PappersCache:
+    def __init__(self, path=PAPPERS_CACHE_DB):
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.lock = threading.Lock()
+        with self.lock:
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute('''CREATE TABLE IF NOT EXISTS search (query TEXT PRIMARY KEY, siren TEXT, nom TEXT, ts REAL)''')
+            self.conn.execute('''CREATE TABLE IF NOT EXISTS company (siren TEXT PRIMARY KEY, nom TEXT, finances TEXT, ts REAL)''')
+            self.conn.commit()
+
+    def get(self, table, key, ttl):
+        col = 'query' if table == 'search' else 'siren'
+        with self.lock:
+            row = self.conn.execute(f"SELECT * FROM {table} WHERE {col} = ?", (key,)).fetchone()
+        return row if row and time.time() - row[-1] < ttl else None
+
+    def put(self, table, row):
+        with self.lock:
+            self.conn.execute(f"INSERT OR REPLACE INTO {table} VALUES (?, ?, ?, ?)", (*row, time.time()))
+            self.conn.commit()
+
+class PappersClient:
+    def __init__(self, api_key, base_url=PAPPERS_URL, cache_path=PAPPERS_CACHE_DB, timeout=10, retries=3):
+        self.base_url, self.timeout = base_url.rstrip('/'), timeout
+        self.cache = PappersCache(cache_path)
+        self.session = requests.Session()
+        retry = Retry(total=retries, backoff_factor=0.5, status_forcelist=[429, 500, 502, 503, 504], allowed_methods=["GET"])
+        adapter = HTTPAdapter(max_retries=retry, pool_maxsize=PAPPERS_WORKERS)
+        self.session.mount("http://", adapter); self.session.mount("https://", adapter)
+        # Clé en en-tête : elle n'apparaît ni dans l'URL ni dans les logs d'accès
+        self.session.headers.update({'User-Agent': 'AquaRisk_Pro_v80', 'api-key': api_key})
+        self.stats = {'hits': 0, 'calls': 0}
+
+    def _get(self, path, params):
+        self.stats['calls'] += 1
+        with metrics.timer(f"pappers.{path}"):
+            r = self.session.get(f"{self.base_url}/{path}", params=params, timeout=self.timeout)
+        if r.status_code == 404: return None
+        if r.status_code in (401, 403): raise PappersError("Clé API invalide")
+        r.raise_for_status()
+        return r.json()
+
+    def search(self, query):
+        """Nom ou SIREN -> (siren, nom) ou None"""
+        q = re.sub(r'\s+', '', query) if SIREN_RE.match(re.sub(r'\s+', '', query)) else query.strip()
+        if SIREN_RE.match(q): return q, None
+        key = q.lower()
+        row = self.cache.get('search', key, TTL_SEARCH)
+        if row:
+            self.stats['hits'] += 1
+            return (row[1], row[2]) if row[1] else None
+        res = self._get("recherche", {"q": q, "par_page": 1})
+        hit = (res or {}).get('resultats') or []
+        siren, nom = (hit[0]['siren'], hit[0].get('nom_entreprise')) if hit else (None, None)
+        self.cache.put('search', (key, siren, nom)) # Cache négatif aussi : un nom introuvable ne coûte qu'une fois
+        return (siren, nom) if siren else None
+
+    def company(self, siren):
+        """SIREN -> (finances, nom) ; finances = dict ca/res/cap/ebitda du dernier exercice"""
+        row = self.cache.get('company', siren, TTL_COMPANY)
+        if row:
+            self.stats['hits'] += 1
+            return json.loads(row[2]), row[1]
+        res = self._get("entreprise", {"siren": siren})
+        if not res: return None, None
+        fin = (res.get('finances') or [{}])[0]
+        stats = {
+            'ca': float(fin.get('chiffre_affaires') or 0),
+            'res': float(fin.get('resultat') or 0),
+            'cap': float(fin.get('capitaux_propres') or 0),
+            'ebitda': float(fin.get('excedent_brut_exploitation') or 0)
+        }
+        nom = res.get('nom_entreprise')
+        self.cache.put('company', (siren, nom, json.dumps(stats)))
+        return stats, nom
+
+    def get_financials(self, query):
+        """Même contrat que utils.get_pappers_data : (stats, nom) ou (None, message d'erreur)"""
+        try:
+            found = self.search(query)
+            if not found: return None, "Introuvable"
+            stats, nom = self.company(found[0])
+            if stats is None: return None, "Introuvable"
+            return stats, nom or found[1]
+        except (PappersError, requests.RequestException, ValueError) as e:
+            metrics.error("pappers", e); return None, str(e)
+
+    def bulk(self, queries, max_workers=PAPPERS_WORKERS):
+        """Import d'une liste de SIREN / noms -> liste de lignes (siren, nom, ca, res, cap, ebitda, statut)"""
+        def one(q):
+            stats, nom = self.get_financials(q)
+            if stats: return {'requete': q, 'nom': nom, **stats, 'statut': "OK"}
+            return {'requete': q, 'nom': None, 'ca': None, 'res': None, 'cap': None, 'ebitda': None, 'statut': nom}
+        queries = [q for q in dict.fromkeys(q.strip() for q in queries) if q]
+        with ThreadPoolExecutor(max_workers=max_workers) as ex:
+            return list(ex.map(one, queries))
+
+_CLIENTS = {}
+_CLIENTS_LOCK = threading.Lock()
+
+def get_pappers_client(api_key):
+    """Un client (et sa session poolée) par clé API, partagé entre sessions Streamlit"""
+    with _CLIENTS_LOCK:
+        if api_key not in _CLIENTS:
+            _CLIENTS[api_key] = PappersClient(api_key, base_url=PAPPERS_URL)
+            metrics.register_cache(f"pappers_{len(_CLIENTS)}", _CLIENTS[api_key].stats, ('hits',), ('calls',))
+        return _CLIENTS[api_key]
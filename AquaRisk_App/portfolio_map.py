@@ -0,0 +1,56 @@
+import html
+import json
+
+# ==============================================================================
+# CARTE GLOBALE DU PORTEFEUILLE : GeoJSON précalculé + clustering côté navigateur
+# ==============================================================================
+# Score global (0-5) -> couleur du marqueur ; None = site jamais audité
+SCORE_COLORS = [(2.0, "#2e7d32"), (3.0, "#f9a825"), (4.0, "#ef6c00"), (float('inf'), "#c62828")]
+NO_AUDIT_COLOR = "#9e9e9e"
+MAP_HEIGHT = 550
+
+def score_color(score):
+    if score is None or score != score: return NO_AUDIT_COLOR # None / NaN
+    return next(c for limit, c in SCORE_COLORS if score < limit)
+
+def to_geojson(df):
+    """DataFrame (id, name, ville, pays, lat, lon, score, date) -> FeatureCollection (une entité Point par site)"""
+    feats = []
+    for r in df.itertuples(index=False):
+        score = None if r.score is None or r.score != r.score else round(float(r.score), 2)
+        feats.append({'type': "Feature", 'geometry': {'type': "Point", 'coordinates': [float(r.lon), float(r.lat)]},
+                      'properties': {'id': int(r.id), 'name': r.name, 'ville': r.ville, 'pays': r.pays,
+                                     'score': score, 'date': r.date, 'color': score_color(score)}})
+    return {'type': "FeatureCollection", 'features': feats}
+
+# Un circleMarker par point, créé par le navigateur dans le cluster (pas un objet folium par site)
+_CALLBACK = """function (row) {
+    var m = L.circleMarker(new L.LatLng(row[0], row[1]), {radius: 7, color: row[2], fillColor: row[2], fillOpacity: 0.85, weight: 1});
+    m.bindPopup(row[3]);
+    return m;
+}"""
+
+def map_html(geojson, height=MAP_HEIGHT):
+    """Page HTML autonome (Leaflet + FastMarkerCluster) : les points partent en un seul tableau JSON"""
+    import folium # Import lourd : seulement quand la carte est demandée
+    from folium.plugins import FastMarkerCluster
+    rows = []
+    for f in geojson['features']:
+        lon, lat = f['geometry']['coordinates']; p = f['properties']
+        score = "Non audité" if p['score'] is None else f"Score : {p['score']:.2f} / 5 ({html.escape(str(p['date']))})"
+        label = f"<b>{html.escape(str(p['name']))}</b><br>{html.escape(str(p['ville']))}, {html.escape(str(p['pays']))}<br>{score}"
+        rows.append([lat, lon, p['color'], label])
+    m = folium.Map(location=[20, 0], zoom_start=2, height=height)
+    if rows:
+        FastMarkerCluster(rows, callback=_CALLBACK).add_to(m)
+        lats, lons = [r[0] for r in rows], [r[1] for r in rows]
+        m.fit_bounds([[min(lats), min(lons)], [max(lats), max(lons)]], max_zoom=10)
+    legend = " ".join(f'<span style="color:{c}">●</span> &lt; {l:g}' if l != float('inf') else f'<span style="color:{c}">●</span> ≥ {SCORE_COLORS[-2][0]:g}'
+                      for l, c in SCORE_COLORS)
+    m.get_root().html.add_child(folium.Element(
+        f'<div style="position:absolute;bottom:12px;left:12px;z-index:1000;background:white;padding:4px 8px;font:12px sans-serif">'
+        f'{legend} <span style="color:{NO_AUDIT_COLOR}">●</span> non audité</div>'))
+    return m.get_root().render()
+
+def geojson_bytes(geojson):
+    return json.dumps(geojson, ensure_ascii=False).encode()
@@ -0,0 +1,105 @@
+import sqlite3
+import threading
+from collections import OrderedDict
+import numpy as np
+
+# ==============================================================================
+# INDEX SPATIAL AQUEDUCT (R-tree SQLite + test point-dans-polygone numpy)
+# Construit une fois depuis le Shapefile baseline téléchargé par setup_map.py,
+# puis interrogé hors-ligne : lat/lon -> score de stress hydrique du bassin.
+# ==============================================================================
+AQUEDUCT_INDEX_DB = 'aqueduct_index.db'
+PIP_CHUNK = 256      # Points testés à la fois contre un polygone (mémoire : PIP_CHUNK x sommets)
+POLY_CACHE = 512     # Polygones décodés gardés en mémoire (LRU)
+
+# Champs du Shapefile Aqueduct 3.0 (baseline annual)
+SCORE_FIELD = 'bws_score'
+LABEL_FIELD = 'bws_label'
+NAME_FIELD = 'name_1'
+
+def build_index(shp_path, db_path=AQUEDUCT_INDEX_DB, score_field=SCORE_FIELD, label_field=LABEL_FIELD, name_field=NAME_FIELD):
+    """Lit le Shapefile et écrit polygones + R-tree des emprises dans db_path. Renvoie le nb de polygones."""
+    try:
+        import shapefile # pyshp
+    except ImportError:
+        raise ImportError("pyshp est requis pour construire l'index : pip install pyshp")
+
+    conn = sqlite3.connect(db_path)
+    conn.execute("DROP TABLE IF EXISTS basins"); conn.execute("DROP TABLE IF EXISTS basins_rtree")
+    conn.execute('''CREATE TABLE basins (id INTEGER PRIMARY KEY, score REAL, label TEXT, name TEXT, parts BLOB, points BLOB)''')
+    conn.execute('''CREATE VIRTUAL TABLE basins_rtree USING rtree(id, minx, maxx, miny, maxy)''')
+    n = 0
+    with shapefile.Reader(shp_path) as sf:
+        fields = [f[0] for f in sf.fields[1:]]
+        for sr in sf.iterShapeRecords():
+            rec = dict(zip(fields, sr.record))
+            shp = sr.shape
+            if not shp.points: continue
+            score = rec.get(score_field)
+            score = float(score) if score is not None and float(score) >= 0 else None # -9999 = pas de donnée
+            pts = np.asarray(shp.points, dtype=np.float64)
+            minx, miny, maxx, maxy = shp.bbox
+            conn.execute("INSERT INTO basins VALUES (?, ?, ?, ?, ?, ?)",
+                         (n, score, rec.get(label_field), rec.get(name_field),
+                          np.asarray(shp.parts, dtype=np.int64).tobytes(), pts.tobytes()))
+            conn.execute("INSERT INTO basins_rtree VALUES (?, ?, ?, ?, ?)", (n, minx, maxx, miny, maxy))
+            n += 1
+    conn.commit(); conn.close()
+    return n
+
+def _points_in_polygon(xs, ys, parts, pts):
+    """Règle pair-impair sur tous les anneaux (gère les trous). xs/ys : tableaux de points à tester."""
+    inside = np.zeros(len(xs), dtype=bool)
+    bounds = list(parts) + [len(pts)]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        for a, b in zip(bounds[:-1], bounds[1:]):
+            x1, y1 = pts[a:b, 0], pts[a:b, 1]
+            x2, y2 = np.roll(x1, 1), np.roll(y1, 1)
+            crosses = (y1[None, :] > ys[:, None]) != (y2[None, :] > ys[:, None])
+            x_int = (x2 - x1)[None, :] * (ys[:, None] - y1[None, :]) / (y2 - y1)[None, :] + x1[None, :]
+            inside ^= (np.count_nonzero(crosses & (xs[:, None] < x_int), axis=1) % 2).astype(bool)
+    return inside
+
+class AqueductIndex:
+    """Lecture de l'index : lookup(lat, lon) et lookup_many([(lat, lon), ...])"""
+    def __init__(self, db_path=AQUEDUCT_INDEX_DB):
+        self.conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True, check_same_thread=False)
+        self.lock = threading.Lock()
+        self._poly = OrderedDict() # Polygones décodés, LRU borné (les bassins d'un portefeuille se répètent)
+
+    def _polygon(self, pid):
+        with self.lock:
+            p = self._poly.get(pid)
+            if p is not None:
+                self._poly.move_to_end(pid); return p
+            score, label, name, parts, pts = self.conn.execute("SELECT score, label, name, parts, points FROM basins WHERE id = ?", (pid,)).fetchone()
+            p = ({'score': score, 'label': label, 'name': name},
+                 np.frombuffer(parts, dtype=np.int64), np.frombuffer(pts, dtype=np.float64).reshape(-1, 2))
+            self._poly[pid] = p
+            if len(self._poly) > POLY_CACHE: self._poly.popitem(last=False)
+        return p
+
+    def lookup_many(self, coords):
+        """[(lat, lon), ...] -> [dict(score, label, name) ou None, ...]"""
+        coords = np.asarray(coords, dtype=np.float64).reshape(-1, 2)
+        out = [None] * len(coords)
+        # 1. Filtre R-tree : candidats par emprise, regroupés par polygone
+        candidats = {}
+        with self.lock:
+            for i, (lat, lon) in enumerate(coords):
+                for (pid,) in self.conn.execute("SELECT id FROM basins_rtree WHERE minx <= ? AND maxx >= ? AND miny <= ? AND maxy >= ?", (lon, lon, lat, lat)):
+                    candidats.setdefault(pid, []).append(i)
+        # 2. Test exact, vectorisé sur tous les points candidats d'un même polygone
+        for pid, idx in candidats.items():
+            idx = [i for i in idx if out[i] is None]
+            if not idx: continue
+            attrs, parts, pts = self._polygon(pid)
+            # Par paquets : les tableaux intermédiaires sont (points x sommets), bornés quelle que soit la taille du lot
+            for k in range(0, len(idx), PIP_CHUNK):
+                sel = np.asarray(idx[k:k + PIP_CHUNK])
+                hit = _points_in_polygon(coords[sel, 1], coords[sel, 0], parts, pts)
+                for i in sel[hit]: out[i] = attrs
+        return out
+
+    def lookup(self, lat, lon):
+        return self.lookup_many([(lat, lon)])[0]
@@ -1,26 +1,30 @@
 import streamlit as st
 import pandas as pd
+import numpy as np
 import sqlite3
 import json
-import os
-import yfinance as yf
-import requests
-import feedparser
 from datetime import datetime
-import matplotlib.pyplot as plt
-import matplotlib
-from fpdf import FPDF
-from staticmap import StaticMap, CircleMarker
-import tempfile
-import urllib.parse
 import re
-import random
-import time # Pour gérer les pauses GPS
+import threading
+import queue
+from contextlib import contextmanager
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import zipfile
+import io
+import logging
+from geocoding import get_geocoder
+from news import get_news_watch
+from weather import get_weather_provider
+from pappers import get_pappers_client
+from market_data import get_market_data
+import metrics
 
-matplotlib.use('Agg')
+log = logging.getLogger(__name__)
 
 # --- 1. INITIALISATION MEMOIRE ---
 def init_session():
+    metrics.inc("streamlit.reruns")
     if 'current_client_id' not in st.session_state: st.session_state['current_client_id'] = None
     if 'current_client_name' not in st.session_state: st.session_state['current_client_name'] = "Nouveau Client"
     if 'current_site_id' not in st.session_state: st.session_state['current_site_id'] = None
@@ -36,147 +40,338 @@ def init_session():
         'score_physique': 0.0, 'score_reglementaire': 0.0, 'score_reputation': 0.0, 'score_resilience': 0.0,
         'news': [], 'wiki_summary': "Pas de données.", 'weather_info': None,
         'valo_finale': 0.0, 'ca': 0.0, 'res': 0.0, 'cap': 0.0, 'ebitda': 0.0,
-        'mode_valo': "PME (Multiples)"
+        'mode_valo': "PME (Multiples)", 'pression_legale': 50, 'risque_image': 50
     }
     for k, v in defaults.items():
         if k not in st.session_state: st.session_state[k] = v
+    # Clés liées aux sliders de Risques 360 : réaffectées pour survivre au changement de page
+    # (Streamlit efface l'état d'un widget non affiché)
+    for k in ('pression_legale', 'risque_image'): st.session_state[k] = int(st.session_state[k])
 
 # --- 2. BASE DE DONNEES ---
 DB_NAME = 'aquarisk_v80.db'
 
+# Colonnes typées des audits : (colonne, type SQL, clé de session). Le reste du snapshot va dans extras_json.
+AUDIT_FIELDS = [
+    ('ent_name', 'TEXT', 'ent_name'), ('site_name', 'TEXT', 'current_site_name'), ('secteur', 'TEXT', 'secteur'),
+    ('ville', 'TEXT', 'ville'), ('pays', 'TEXT', 'pays'), ('lat', 'REAL', 'lat'), ('lon', 'REAL', 'lon'),
+    ('mode_valo', 'TEXT', 'mode_valo'), ('valo', 'REAL', 'valo_finale'),
+    ('ca', 'REAL', 'ca'), ('res', 'REAL', 'res'), ('cap', 'REAL', 'cap'), ('ebitda', 'REAL', 'ebitda'),
+    ('vol_eau', 'REAL', 'vol_eau'), ('prix_eau', 'REAL', 'prix_eau'), ('energie_conso', 'REAL', 'energie_conso'),
+    ('part_fournisseur_risk', 'REAL', 'part_fournisseur_risk'), ('reut_invest', 'INTEGER', 'reut_invest'),
+    ('pression_legale', 'REAL', 'pression_legale'), ('risque_image', 'REAL', 'risque_image'),
+    ('score_global', 'REAL', 'score_global'), ('score_physique', 'REAL', 'score_physique'),
+    ('score_reglementaire', 'REAL', 'score_reglementaire'), ('score_reputation', 'REAL', 'score_reputation'),
+    ('score_resilience', 'REAL', 'score_resilience'), ('var_amount', 'REAL', 'var_amount'),
+]
+AUDIT_COLS = [c for c, _, _ in AUDIT_FIELDS]
+AUDIT_SKIP = {'news', 'weather_info', 'current_client_id', 'pappers_bulk', 'portfolio_report'} # Transitoire ou volumineux
+
+SCHEMA = [
+    '''CREATE TABLE IF NOT EXISTS clients (id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT UNIQUE, secteur TEXT, date_creation TEXT)''',
+    '''CREATE TABLE IF NOT EXISTS sites (id INTEGER PRIMARY KEY AUTOINCREMENT, client_id INTEGER, name TEXT, pays TEXT, ville TEXT, lat REAL, lon REAL, activite TEXT, FOREIGN KEY(client_id) REFERENCES clients(id))''',
+    f'''CREATE TABLE IF NOT EXISTS audits (id INTEGER PRIMARY KEY AUTOINCREMENT, site_id INTEGER, date TEXT,
+        {", ".join(f"{c} {t}" for c, t, _ in AUDIT_FIELDS)}, extras_json TEXT, FOREIGN KEY(site_id) REFERENCES sites(id))''',
+    "CREATE INDEX IF NOT EXISTS idx_sites_client ON sites(client_id)",
+    "CREATE INDEX IF NOT EXISTS idx_audits_site_date ON audits(site_id, date DESC)",
+    "CREATE INDEX IF NOT EXISTS idx_audits_date ON audits(date)",
+]
+PRAGMAS = ["PRAGMA journal_mode=WAL", "PRAGMA synchronous=NORMAL", "PRAGMA busy_timeout=5000",
+           "PRAGMA temp_store=MEMORY", "PRAGMA cache_size=-8000"]
+
+class ConnectionPool:
+    """Pool de connexions SQLite partagé par toutes les sessions Streamlit (thread-safe).
+    Le schéma est créé une seule fois par process et par fichier."""
+    def __init__(self, path, size=4):
+        self.path, self.size = path, size
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._schema_ok = False
+
+    def _open(self):
+        conn = sqlite3.connect(self.path, check_same_thread=False, timeout=5)
+        for p in PRAGMAS: conn.execute(p)
+        return conn
+
+    def ensure_schema(self):
+        if self._schema_ok: return
+        with self._lock:
+            if self._schema_ok: return
+            conn = self._open()
+            try:
+                for q in SCHEMA[:3]: conn.execute(q)
+                migrate_audits(conn)
+                for q in SCHEMA[3:]: conn.execute(q)
+                conn.commit()
+            finally: self._idle.put(conn)
+            self._schema_ok = True
+
+    @contextmanager
+    def connection(self):
+        self.ensure_schema()
+        try: conn = self._idle.get_nowait()
+        except queue.Empty: conn = self._open()
+        try:
+            yield conn
+            conn.commit()
+        except Exception as e:
+            conn.rollback(); metrics.error("sqlite", e); raise
+        finally:
+            if self._idle.qsize() < self.size: self._idle.put(conn)
+            else: conn.close()
+
+    def close(self):
+        while True:
+            try: self._idle.get_nowait().close()
+            except queue.Empty: break
+        self._schema_ok = False
+
+_POOLS = {}
+_POOLS_LOCK = threading.Lock()
+
+def get_pool(path=None):
+    path = path or DB_NAME
+    pool = _POOLS.get(path)
+    if pool is None:
+        with _POOLS_LOCK: pool = _POOLS.setdefault(path, ConnectionPool(path))
+    return pool
+
+def db_conn():
+    """with utils.db_conn() as conn: ... (commit auto, rollback si exception)"""
+    return get_pool().connection()
+
 def init_db():
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
-    c.execute('''CREATE TABLE IF NOT EXISTS clients (id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT UNIQUE, secteur TEXT, date_creation TEXT)''')
-    c.execute('''CREATE TABLE IF NOT EXISTS sites (id INTEGER PRIMARY KEY AUTOINCREMENT, client_id INTEGER, name TEXT, pays TEXT, ville TEXT, lat REAL, lon REAL, activite TEXT, FOREIGN KEY(client_id) REFERENCES clients(id))''')
-    c.execute('''CREATE TABLE IF NOT EXISTS audits (id INTEGER PRIMARY KEY AUTOINCREMENT, site_id INTEGER, date TEXT, score_global REAL, valo REAL, inputs_json TEXT, FOREIGN KEY(site_id) REFERENCES sites(id))''')
-    conn.commit(); conn.close()
+    get_pool().ensure_schema()
+
+def migrate_audits(conn):
+    """Anciennes bases (snapshot complet dans inputs_json) : ajoute les colonnes typées, les remplit
+    en SQL (json_extract) et ne garde dans extras_json que les champs libres. Idempotent.
+    Rien n'est supprimé : inputs_json est renommé inputs_json_legacy (nettoyage explicite plus tard) ;
+    les lignes au JSON invalide y restent intactes et sont signalées dans le journal."""
+    cols = {r[1] for r in conn.execute("PRAGMA table_info(audits)")}
+    for c, t, _ in AUDIT_FIELDS + [('extras_json', 'TEXT', None)]:
+        if c not in cols: conn.execute(f"ALTER TABLE audits ADD COLUMN {c} {t}")
+    if 'inputs_json' not in cols: return
+    sets = ", ".join(f"{c} = COALESCE({c}, json_extract(inputs_json, '$.{k}'))" for c, _, k in AUDIT_FIELDS)
+    removed = ", ".join(f"'$.{k}'" for k in [k for _, _, k in AUDIT_FIELDS] + sorted(AUDIT_SKIP))
+    conn.execute(f'''UPDATE audits SET {sets}, extras_json = json_remove(inputs_json, {removed})
+                     WHERE inputs_json IS NOT NULL AND json_valid(inputs_json)''')
+    invalid = conn.execute("SELECT COUNT(*) FROM audits WHERE inputs_json IS NOT NULL AND NOT json_valid(inputs_json)").fetchone()[0]
+    if invalid: log.warning("migrate_audits : %d audit(s) au JSON invalide non migrés (conservés dans audits.inputs_json_legacy)", invalid)
+    conn.execute("ALTER TABLE audits RENAME COLUMN inputs_json TO inputs_json_legacy")
+
+# LECTURES PARTAGÉES ENTRE SESSIONS (st.cache_data)
+# Chaque lecture est indexée par la version de ce qu'elle lit ; les écritures incrémentent exactement
+# ces versions (create_client -> clients, create_site -> sites du client, save_audit_snapshot -> audits
+# du client et du site). Une entrée périmée n'est donc jamais relue ; elle sort du cache par TTL / LRU.
+READ_TTL = 3600
+_VERSIONS = {}
+_VERSIONS_LOCK = threading.Lock()
+
+def _version(*key):
+    return _VERSIONS.get((DB_NAME,) + key, 0)
+
+def _bump(*key):
+    k = (DB_NAME,) + key
+    with _VERSIONS_LOCK: _VERSIONS[k] = _VERSIONS.get(k, 0) + 1
+
+@st.cache_data(ttl=READ_TTL, max_entries=512, show_spinner=False)
+def _read_sql(db, version, q, params=()):
+    with get_pool(db).connection() as conn: return pd.read_sql(q, conn, params=params)
 
 # CRUD (Versions simplifiées pour stabilité)
 def create_client(n, s): 
-    init_db(); conn = sqlite3.connect(DB_NAME); c = conn.cursor()
-    try: c.execute("INSERT INTO clients (name, secteur, date_creation) VALUES (?, ?, ?)", (n, s, datetime.now().strftime("%Y-%m-%d"))); cid = c.lastrowid; conn.commit(); return cid, "OK"
-    except: return None, "Erreur"
-    finally: conn.close()
+    try:
+        with db_conn() as conn:
+            c = conn.execute("INSERT INTO clients (name, secteur, date_creation) VALUES (?, ?, ?)", (n, s, datetime.now().strftime("%Y-%m-%d")))
+    except sqlite3.Error as e:
+        metrics.error("db.create_client", e); return None, "Erreur"
+    _bump('clients') # Après le commit : un lecteur ne peut pas remettre en cache l'état d'avant
+    return c.lastrowid, "OK"
 
+@metrics.timed("db.get_clients")
 def get_clients(): 
-    init_db(); conn = sqlite3.connect(DB_NAME); df = pd.read_sql("SELECT * FROM clients ORDER BY name", conn); conn.close(); return df
+    return _read_sql(DB_NAME, _version('clients'), "SELECT * FROM clients ORDER BY name")
 
 def create_site(cid, n, p, v, lat, lon, act):
-    init_db(); conn = sqlite3.connect(DB_NAME); c = conn.cursor()
-    c.execute("INSERT INTO sites (client_id, name, pays, ville, lat, lon, activite) VALUES (?, ?, ?, ?, ?, ?, ?)", (cid, n, p, v, lat, lon, act))
-    conn.commit(); conn.close()
+    with db_conn() as conn:
+        conn.execute("INSERT INTO sites (client_id, name, pays, ville, lat, lon, activite) VALUES (?, ?, ?, ?, ?, ?, ?)", (cid, n, p, v, lat, lon, act))
+    _bump('sites', int(cid))
 
+@metrics.timed("db.get_sites")
 def get_sites(cid):
-    init_db(); conn = sqlite3.connect(DB_NAME); df = pd.read_sql("SELECT * FROM sites WHERE client_id = ?", conn, params=(cid,)); conn.close(); return df
+    return _read_sql(DB_NAME, _version('sites', int(cid)), "SELECT * FROM sites WHERE client_id = ?", (int(cid),))
 
+@metrics.timed("db.get_site_history")
 def get_site_history(site_id):
-    init_db(); conn = sqlite3.connect(DB_NAME); 
-    df = pd.read_sql("SELECT id, date, score_global, valo FROM audits WHERE site_id = ? ORDER BY date DESC", conn, params=(site_id,)); conn.close(); return df
+    return _read_sql(DB_NAME, _version('site_audits', int(site_id)),
+                     "SELECT id, date, score_global, valo FROM audits WHERE site_id = ? ORDER BY date DESC, id DESC", (int(site_id),))
 
+def count_sites(cid):
+    return int(_read_sql(DB_NAME, _version('sites', int(cid)), "SELECT COUNT(*) AS n FROM sites WHERE client_id = ?", (int(cid),))['n'].iloc[0])
+
+HISTORY_COLS = ['id', 'date', 'score_global', 'valo']
+
+@metrics.timed("db.get_sites_with_history")
+def get_sites_with_history(cid, limit=20, offset=0, n_audits=5):
+    """Une page de sites + leurs n derniers audits en une seule requête (évite le N+1 de get_site_history).
+    Renvoie (df_sites, {site_id: df_historique})."""
+    cid = int(cid)
+    return _sites_with_history(DB_NAME, (_version('sites', cid), _version('audits', cid)), cid, limit, offset, n_audits)
+
+@st.cache_data(ttl=READ_TTL, max_entries=256, show_spinner=False)
+def _sites_with_history(db, version, cid, limit, offset, n_audits):
+    q = '''WITH s AS (SELECT * FROM sites WHERE client_id = ? ORDER BY id LIMIT ? OFFSET ?),
+                a AS (SELECT id AS audit_id, site_id, date AS audit_date, score_global AS audit_score, valo AS audit_valo,
+                             ROW_NUMBER() OVER (PARTITION BY site_id ORDER BY date DESC, id DESC) AS rn
+                      FROM audits WHERE site_id IN (SELECT id FROM s))
+           SELECT s.*, a.audit_id, a.audit_date, a.audit_score, a.audit_valo
+           FROM s LEFT JOIN a ON a.site_id = s.id AND a.rn <= ?
+           ORDER BY s.id, a.audit_date DESC, a.audit_id DESC'''
+    with get_pool(db).connection() as conn:
+        df = pd.read_sql(q, conn, params=(cid, -1 if limit is None else limit, offset, n_audits))
+    audit_cols = ['audit_id', 'audit_date', 'audit_score', 'audit_valo']
+    sites = df.drop(columns=audit_cols).drop_duplicates('id').reset_index(drop=True)
+    hist = df.dropna(subset=['audit_id'])
+    histories = {int(sid): g[audit_cols].set_axis(HISTORY_COLS, axis=1).astype({'id': int}).reset_index(drop=True)
+                 for sid, g in hist.groupby('id')}
+    return sites, histories
+
+def audit_to_dict(row):
+    """Ligne (colonnes AUDIT_COLS + extras_json) -> dict de session. Les colonnes vides (anciens audits) sont omises."""
+    d = json.loads(row[-1]) if row[-1] else {}
+    for (c, t, k), v in zip(AUDIT_FIELDS, row):
+        if v is not None: d[k] = bool(v) if t == 'INTEGER' else v
+    return d
+
+@metrics.timed("db.load_audit")
 def load_audit_to_session(audit_id):
-    init_db(); conn = sqlite3.connect(DB_NAME); c = conn.cursor()
-    c.execute("SELECT inputs_json FROM audits WHERE id = ?", (audit_id,))
-    res = c.fetchone()
-    conn.close()
+    with db_conn() as conn:
+        res = conn.execute(f"SELECT {', '.join(AUDIT_COLS)}, extras_json FROM audits WHERE id = ?", (audit_id,)).fetchone()
     if res:
-        data = json.loads(res[0])
-        for k, v in data.items(): st.session_state[k] = v
+        for k, v in audit_to_dict(res).items(): st.session_state[k] = v
         return True
     return False
 
+def _typed(v, t):
+    if v is None: return None
+    try: return str(v) if t == 'TEXT' else int(bool(v)) if t == 'INTEGER' else float(v)
+    except (TypeError, ValueError): return None
+
+@metrics.timed("db.save_audit")
 def save_audit_snapshot(site_id, data):
-    init_db(); conn = sqlite3.connect(DB_NAME); c = conn.cursor()
-    clean = {k:v for k,v in data.items() if k not in ['news', 'weather_info', 'current_client_id']}
-    c.execute("INSERT INTO audits (site_id, date, score_global, valo, inputs_json) VALUES (?, ?, ?, ?, ?)",
-             (site_id, datetime.now().strftime("%Y-%m-%d %H:%M"), data.get('score_global', 0), data.get('valo_finale', 0), json.dumps(clean, default=str)))
-    conn.commit(); conn.close()
+    keys = {k for _, _, k in AUDIT_FIELDS}
+    values = [_typed(data.get(k), t) for _, t, k in AUDIT_FIELDS]
+    extras = {k: v for k, v in data.items() if k not in keys and k not in AUDIT_SKIP}
+    with db_conn() as conn:
+        conn.execute(f"INSERT INTO audits (site_id, date, {', '.join(AUDIT_COLS)}, extras_json) VALUES ({', '.join('?' * (len(AUDIT_COLS) + 3))})",
+                     (site_id, datetime.now().strftime("%Y-%m-%d %H:%M"), *values, json.dumps(extras, default=str)))
+        cid = conn.execute("SELECT client_id FROM sites WHERE id = ?", (site_id,)).fetchone()
+    _bump('site_audits', int(site_id))
+    if cid: _bump('audits', int(cid[0]))
     return "✅ Version enregistrée."
 
+# Agrégats du portefeuille : calculés par SQLite sur les colonnes typées (aucun json.loads)
+LATEST_AUDITS = '''SELECT a.*, ROW_NUMBER() OVER (PARTITION BY a.site_id ORDER BY a.date DESC, a.id DESC) AS rn
+                   FROM audits a JOIN sites s ON s.id = a.site_id WHERE s.client_id = ?'''
+
+@metrics.timed("db.portfolio_summary")
+def get_portfolio_summary(cid):
+    """Dernier audit de chaque site, agrégé par secteur : nb de sites, score moyen, VaR et valorisation totales"""
+    q = f'''SELECT COALESCE(secteur, 'N/A') AS secteur, COUNT(*) AS sites, AVG(score_global) AS score_moyen,
+                   MAX(score_global) AS score_max, SUM(var_amount) AS var_totale, SUM(valo) AS valo_totale
+            FROM ({LATEST_AUDITS}) WHERE rn = 1 GROUP BY 1 ORDER BY var_totale DESC'''
+    return _read_sql(DB_NAME, _version('audits', int(cid)), q, (int(cid),))
+
+@metrics.timed("db.score_trend")
+def get_score_trend(cid, period="%Y-%m"):
+    """Tous les audits du client par période (strftime) : évolution des scores, de la VaR et des paramètres"""
+    q = '''SELECT strftime(?, a.date) AS periode, COUNT(*) AS audits, AVG(a.score_global) AS score_moyen,
+                  SUM(a.var_amount) AS var_totale, AVG(a.pression_legale) AS pression_legale, AVG(a.risque_image) AS risque_image
+           FROM audits a JOIN sites s ON s.id = a.site_id WHERE s.client_id = ?
+           GROUP BY 1 ORDER BY 1'''
+    return _read_sql(DB_NAME, _version('audits', int(cid)), q, (period, int(cid)))
+
+# Carte globale : GeoJSON des sites (couleur = dernier score) et page de carte, reconstruits seulement
+# quand les sites ou les audits du client changent (mêmes versions que les lectures ci-dessus)
+@metrics.timed("db.portfolio_geojson")
+def get_portfolio_geojson(cid):
+    cid = int(cid)
+    return _portfolio_geojson(DB_NAME, (_version('sites', cid), _version('audits', cid)), cid)
+
+@st.cache_data(ttl=READ_TTL, max_entries=64, show_spinner=False)
+def _portfolio_geojson(db, version, cid):
+    import portfolio_map
+    # Les sites non géocodés (0, 0 : voir Home) sont exclus de la carte
+    q = f'''SELECT s.id, s.name, s.ville, s.pays, s.lat, s.lon, l.score_global AS score, l.date
+             FROM sites s LEFT JOIN ({LATEST_AUDITS}) l ON l.site_id = s.id AND l.rn = 1
+             WHERE s.client_id = ? AND s.lat IS NOT NULL AND s.lon IS NOT NULL AND NOT (s.lat = 0 AND s.lon = 0)'''
+    with get_pool(db).connection() as conn: df = pd.read_sql(q, conn, params=(cid, cid))
+    return portfolio_map.to_geojson(df)
+
+@metrics.timed("map.portfolio_html")
+def get_portfolio_map_html(cid):
+    cid = int(cid)
+    return _portfolio_map_html(DB_NAME, (_version('sites', cid), _version('audits', cid)), cid)
+
+@st.cache_data(ttl=READ_TTL, max_entries=64, show_spinner=False)
+def _portfolio_map_html(db, version, cid):
+    import portfolio_map
+    return portfolio_map.map_html(get_portfolio_geojson(cid))
+
 # --- 3. FONCTIONS EXTERNES ROBUSTES (GPS, METEO, VEILLE) ---
 
-# GPS : Utilise requests directement au lieu de geopy pour mieux contrôler les erreurs
+# GPS : Nominatim via le géocodeur partagé (cache disque, voir geocoding.py)
+@metrics.timed("ext.geocode")
 def get_gps_coordinates(ville, pays):
-    try:
-        query = f"{ville}, {pays}"
-        url = "https://nominatim.openstreetmap.org/search"
-        # User-Agent aléatoire CRUCIAL pour éviter l'erreur 403
-        ua = f"AquaRisk_Tool_{random.randint(10000, 99999)}"
-        headers = {'User-Agent': ua}
-        params = {'q': query, 'format': 'json', 'limit': 1}
-        
-        r = requests.get(url, params=params, headers=headers, timeout=5)
-        if r.status_code == 200 and r.json():
-            data = r.json()[0]
-            return float(data['lat']), float(data['lon']), data.get('display_name', query)
-    except: pass
-    return None, None, None
-
-# VEILLE : Google News RSS
+    return get_geocoder().geocode(ville, pays)
+
+# VEILLE : Google News RSS (cache par sujet + requêtes conditionnelles, voir news.py)
+@metrics.timed("ext.news")
 def fetch_automated_news(topic="Water Risk"):
-    news_items = []
-    try:
-        # Encodage propre
-        encoded = urllib.parse.quote(topic)
-        url = f"https://news.google.com/rss/search?q={encoded}&hl=fr&gl=FR&ceid=FR:fr"
-        feed = feedparser.parse(url)
-        
-        for e in feed.entries[:6]: # Top 6
-            news_items.append({
-                "title": e.title,
-                "link": e.link,
-                "date": e.published if 'published' in e else "Récent"
-            })
-    except: pass
+    news_items = get_news_watch().fetch(topic)[:6] # Top 6
     
     # Fallback si vide (pour ne pas avoir de case vide)
     if not news_items:
-        news_items.append({"title": "Aucune actualité récente trouvée sur ce sujet spécifique.", "link": "#", "date": ""})
+        news_items = [{"title": "Aucune actualité récente trouvée sur ce sujet spécifique.", "link": "#", "date": ""}]
         
     return news_items
 
-# METEO : Open-Meteo
+# METEO : Open-Meteo (requêtes groupées + cache, voir weather.py)
+@metrics.timed("ext.weather")
 def get_weather_data(lat, lon):
-    try:
-        url = "https://api.open-meteo.com/v1/forecast"
-        params = {"latitude": lat, "longitude": lon, "current_weather": "true", "daily": "temperature_2m_max,precipitation_sum"}
-        r = requests.get(url, params=params, timeout=4)
-        if r.status_code == 200:
-            d = r.json()
-            return {
-                "temp": d['current_weather']['temperature'],
-                "wind": d['current_weather']['windspeed'],
-                "rain_today": d['daily']['precipitation_sum'][0] if 'daily' in d else 0
-            }
-    except: pass
-    return None
+    return get_weather_provider().get(lat, lon)
+
+@metrics.timed("ext.weather_many")
+def get_weather_many(df_sites):
+    """Météo de tout un portefeuille (colonnes lat/lon) en quelques requêtes -> DataFrame aligné sur df_sites"""
+    w = get_weather_provider().get_many(zip(df_sites['lat'], df_sites['lon']))
+    w.index = df_sites.index
+    return w
 
 # FINANCE : Pappers & Yahoo
-HEADERS_WEB = {'User-Agent': 'AquaRisk_Pro_v80'}
 
+@metrics.timed("ext.pappers")
 def get_pappers_data(query, api_key):
     if not api_key: return None, "Clé API manquante"
-    try:
-        url = "https://api.pappers.fr/v2/recherche"
-        r = requests.get(url, params={"q": query, "api_token": api_key, "par_page": 1}, headers=HEADERS_WEB)
-        if r.status_code == 200 and r.json().get('resultats'):
-            res = r.json()['resultats'][0]
-            r2 = requests.get(f"https://api.pappers.fr/v2/entreprise?api_token={api_key}&siren={res['siren']}", headers=HEADERS_WEB)
-            fin = r2.json().get('finances', [{}])[0]
-            return {
-                'ca': float(fin.get('chiffre_affaires') or 0),
-                'res': float(fin.get('resultat') or 0),
-                'cap': float(fin.get('capitaux_propres') or 0),
-                'ebitda': float(fin.get('excedent_brut_exploitation') or 0)
-            }, res.get('nom_entreprise')
-    except Exception as e: return None, str(e)
-    return None, "Introuvable"
+    return get_pappers_client(api_key).get_financials(query)
 
+@metrics.timed("ext.pappers_bulk")
+def get_pappers_bulk(queries, api_key):
+    """Import en masse d'une liste de SIREN / noms -> DataFrame"""
+    if not api_key: return pd.DataFrame()
+    return pd.DataFrame(get_pappers_client(api_key).bulk(queries))
+
+@metrics.timed("ext.market_quote")
 def get_yahoo_data(ticker):
-    try:
-        t = yf.Ticker(ticker); v = t.fast_info.market_cap
-        return float(v or 0), t.info.get('shortName', ticker), t.info.get('sector', 'N/A')
-    except: return 0.0, "Err", "N/A"
+    """-> (capitalisation, nom, secteur, erreur). Voir market_data.py (lot + cache par jour de bourse)."""
+    q = get_market_data().quote(ticker)
+    return (float(q['market_cap']) if pd.notna(q['market_cap']) else 0.0), q['name'], q['sector'], q['error']
+
+@metrics.timed("ext.market_quotes")
+def get_market_caps(tickers):
+    """Capitalisations d'un portefeuille coté en un appel groupé -> DataFrame (colonne 'error' par ticker)"""
+    return get_market_data().quotes(tickers)
 
 def run_ocr_scan(f): return {'ca': 1000000, 'res': 50000, 'found': True}, "OCR: Données extraites (Simulé)"
 
@@ -205,18 +400,62 @@ def calculate_financial_impact(data, score):
     vuln = SECTEURS.get(secteur, 0.1)
     return data['valo_finale'] * vuln * (score / 10.0)
 
+# Scoring portefeuille : mêmes formules que ci-dessus, mais sur N sites en une passe numpy
+SCORING_INPUTS = ['lat', 'secteur', 'reut_invest', 'part_fournisseur_risk', 'valo_finale']
+SCORING_PARAMS = {'pression_legale': 50, 'risque_image': 50}
+
+@metrics.timed("score.portfolio")
+def calculate_portfolio_scores(sites, params=None):
+    """Score N sites d'un coup (DataFrame ou dict de tableaux). Les colonnes 'pression_legale' /
+    'risque_image' éventuelles priment sur params. Renvoie les sous-scores, le score global et la VaR."""
+    df = sites if isinstance(sites, pd.DataFrame) else pd.DataFrame(sites)
+    params = {**SCORING_PARAMS, **(params or {})}
+    n = len(df)
+
+    def col(name, default):
+        if name in df.columns: return df[name].where(df[name].notna(), default)
+        return pd.Series([default] * n, index=df.index)
+
+    secteur = col('secteur', SECTEURS_LISTE[0])
+    coeff = secteur.map(SECTEURS).fillna(0.5).to_numpy(dtype=float)
+    vuln = secteur.map(SECTEURS).fillna(0.1).to_numpy(dtype=float)
+    lat = col('lat', 0.0).to_numpy(dtype=float)
+    reut = col('reut_invest', False).astype(bool).to_numpy()
+    p_leg = col('pression_legale', params['pression_legale']).to_numpy(dtype=float)
+    p_img = col('risque_image', params['risque_image']).to_numpy(dtype=float)
+    p_sup = col('part_fournisseur_risk', 0.0).to_numpy(dtype=float)
+    valo = col('valo_finale', 0.0).to_numpy(dtype=float)
+
+    s_phys = np.clip((2.0 + np.abs(lat) / 40.0) * coeff * 1.5, 1, 5) * 0.40
+    s_reg = np.minimum(np.where(reut, 1.5, 4.0) + p_leg / 100.0, 5) * 0.30
+    s_rep = (p_img / 20.0) * 0.10
+    s_res = (1 + p_sup / 20.0) * 0.20
+    global_s = np.minimum((s_phys + s_reg + s_rep + s_res) * (10 / 3.5), 5.0)
+
+    return pd.DataFrame({
+        'score_global': global_s, 'score_physique': s_phys, 'score_reglementaire': s_reg,
+        'score_reputation': s_rep, 'score_resilience': s_res,
+        'var_amount': valo * vuln * (global_s / 10.0)
+    }, index=df.index)
+
 # --- 5. PDF GENERATOR ---
-def create_static_map(lat, lon):
-    try:
-        m = StaticMap(400, 300)
-        m.add_marker(CircleMarker((lon, lat), 'red', 10))
-        img = m.render(zoom=10)
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".png") as t:
-            img.save(t.name); return t.name
-    except: return None
+@metrics.timed("pdf.static_map")
+def create_static_map(lat, lon, zoom=10, size=(400, 300)):
+    """Vignette du site, via le cache disque de tuiles/vignettes (map_cache.py). Le fichier renvoyé appartient au cache."""
+    from map_cache import get_renderer # staticmap / Pillow : chargés au premier rapport
+    try: return get_renderer().thumbnail(lat, lon, zoom, size)
+    except Exception as e:
+        metrics.error("pdf.static_map", e); return None
 
+@metrics.timed("pdf.generate_report")
 def generate_pdf_report(data):
+    from fpdf import FPDF
     pdf = FPDF()
+    add_site_report(pdf, data)
+    return pdf.output(dest='S').encode('latin-1', 'replace')
+
+def add_site_report(pdf, data, map_path=None):
+    """Ajoute le rapport d'un site (nouvelle page) à un FPDF existant. map_path : vignette déjà rendue."""
     pdf.add_page()
     
     pdf.set_font("Arial", 'B', 24); pdf.cell(0, 20, "AUDIT AQUARISK", ln=1, align='C')
@@ -245,9 +484,9 @@ def generate_pdf_report(data):
     pdf.cell(0, 10, f"Perte Estimée: -{data.get('var_amount', 0):,.0f} EUR", ln=1)
     
     # Carte
-    map_path = create_static_map(data.get('lat'), data.get('lon'))
+    if map_path is None: map_path = create_static_map(data.get('lat'), data.get('lon'))
     if map_path: 
-        pdf.image(map_path, x=120, y=60, w=80); os.remove(map_path)
+        pdf.image(map_path, x=120, y=60, w=80)
 
     # Météo & Veille
     pdf.ln(10); pdf.set_font("Arial", 'B', 14); pdf.cell(0, 10, "4. CONTEXTE LOCAL & VEILLE", ln=1)
@@ -259,7 +498,146 @@ def generate_pdf_report(data):
     pdf.ln(5); pdf.set_font("Arial", '', 10)
     for n in data.get('news', [])[:5]:
         try: pdf.cell(0, 8, f"- {n['title'][:85]}...", ln=1)
-        except: continue
+        except Exception as e: metrics.error("pdf.news_line", e)
 
-    return pdf.output(dest='S').encode('latin-1', 'replace')
+# --- 6. EXPORTS EXCEL ---
+@metrics.timed("excel.generate")
+def generate_excel(data):
+    """Fiche Excel de l'audit en cours (petite, en mémoire)"""
+    import xlsxwriter
+    output = io.BytesIO()
+    wb = xlsxwriter.Workbook(output, {'in_memory': True})
+    ws = wb.add_worksheet("Audit")
+    ws.write_row(0, 0, ["Indicateur", "Valeur"])
+    for i, k in enumerate(['ent_name', 'current_site_name', 'ville', 'pays', 'secteur', 'valo_finale', 'ca', 'res', 'cap', 'ebitda',
+                           'score_global', 'score_physique', 'score_reglementaire', 'score_reputation', 'score_resilience', 'var_amount'], 1):
+        v = data.get(k)
+        ws.write_row(i, 0, [k, v if isinstance(v, (int, float, str)) or v is None else str(v)])
+    wb.close()
+    return output.getvalue()
+
+EXPORT_COLS = ['client_id', 'client', 'client_secteur', 'client_creation', 'site_id', 'site', 'ville', 'pays', 'lat', 'lon',
+               'activite', 'audit_id', 'date'] + [f"audit.{c}" if c in ('ville', 'pays', 'lat', 'lon') else c for c in AUDIT_COLS]
+XLSX_MAX_ROWS = 1048576
+
+@metrics.timed("excel.export_portfolio")
+def export_portfolio_excel(out_path, batch=5000):
+    """Export de tous les clients / sites / audits : colonnes typées, puis champs libres (extras_json) à plat.
+    xlsxwriter en constant_memory + curseur SQLite parcouru par lots : mémoire stable quel que soit le volume."""
+    import xlsxwriter
+    with db_conn() as conn:
+        # Champs libres : découverts par SQLite (json_each), sans charger les blobs en Python
+        keys = [r[0] for r in conn.execute("SELECT DISTINCT j.key FROM audits, json_each(audits.extras_json) j "
+                                           "WHERE json_valid(audits.extras_json) ORDER BY j.key")]
+        headers = EXPORT_COLS + [k if k not in EXPORT_COLS else f"extras.{k}" for k in keys]
+        extract = "".join(", json_extract(a.extras_json, ?)" for _ in keys)
+        q = f'''SELECT c.id, c.name, c.secteur, c.date_creation, s.id, s.name, s.ville, s.pays, s.lat, s.lon, s.activite,
+                   a.id, a.date, {", ".join(f"a.{c}" for c in AUDIT_COLS)}{extract}
+                FROM clients c LEFT JOIN sites s ON s.client_id = c.id LEFT JOIN audits a ON a.site_id = s.id
+                ORDER BY c.name, s.id, a.date'''
+        params = ['$."' + k.replace('"', '""') + '"' for k in keys]
+
+        wb = xlsxwriter.Workbook(out_path, {'constant_memory': True})
+        bold = wb.add_format({'bold': True})
+        ws, row, n_sheet = None, XLSX_MAX_ROWS, 0
+        cur = conn.execute(q, params)
+        while True:
+            rows = cur.fetchmany(batch)
+            if not rows: break
+            for r in rows:
+                if row >= XLSX_MAX_ROWS: # Feuille pleine : on continue sur la suivante
+                    n_sheet += 1
+                    ws = wb.add_worksheet(f"Portefeuille_{n_sheet}")
+                    ws.write_row(0, 0, headers, bold); ws.freeze_panes(1, 0)
+                    row = 1
+                ws.write_row(row, 0, r); row += 1
+        if ws is None:
+            ws = wb.add_worksheet("Portefeuille_1"); ws.write_row(0, 0, headers, bold)
+        wb.close()
+    return out_path
+
+# --- 7. RAPPORTS DU PORTEFEUILLE (EN MASSE) ---
+@metrics.timed("db.latest_snapshots")
+def get_latest_snapshots(cid):
+    """Tous les sites d'un client + leur dernier audit, en une requête. Sites jamais audités inclus."""
+    q = f'''SELECT s.id AS site_id, s.name AS site_name, s.ville, s.pays, s.lat, s.lon, c.name AS client_name, c.secteur AS client_secteur,
+                  a.date AS audit_date, {", ".join(f"a.{c}" for c in AUDIT_COLS)}, a.extras_json
+           FROM sites s JOIN clients c ON c.id = s.client_id
+           LEFT JOIN audits a ON a.id = (SELECT id FROM audits WHERE site_id = s.id ORDER BY date DESC, id DESC LIMIT 1)
+           WHERE s.client_id = ? ORDER BY s.id'''
+    with db_conn() as conn:
+        rows = conn.execute(q, (cid,)).fetchall()
+    out = []
+    for site_id, name, ville, pays, lat, lon, client, secteur, date, *audit in rows:
+        d = {'ent_name': client, 'secteur': secteur, 'score_global': 0.0, 'valo_finale': 0.0}
+        if date: d.update(audit_to_dict(audit))
+        # Le site fait foi pour l'identité et la position (le snapshot peut dater d'un autre site chargé)
+        d.update({'current_site_id': site_id, 'current_site_name': name, 'ville': ville, 'pays': pays,
+                  'lat': lat, 'lon': lon, 'audit_date': date})
+        out.append(d)
+    return out
+
+def _safe_filename(s):
+    return re.sub(r'[^A-Za-z0-9_-]+', '_', str(s)).strip('_')[:60] or "site"
+
+@metrics.timed("pdf.portfolio_reports")
+def generate_portfolio_reports(cid, out_path, mode="zip", workers=8, with_news=True, progress=None):
+    """Un rapport par site du client. mode='zip' : un PDF par site dans une archive ; mode='book' : un seul PDF.
+    Seule la préparation (I/O : vignettes de carte en cache disque, veille avec une requête par sujet) tourne en
+    parallèle, dans une fenêtre de workers * 2 sites ; le rendu FPDF (Python pur, GIL) se fait dans l'ordre, au fil de l'eau.
+    Un site en échec n'arrête pas le lot : il est remplacé par une note d'erreur (page ou fichier _ERREUR.txt).
+    Écrit sur disque dans out_path et le renvoie."""
+    from fpdf import FPDF
+    sites = get_latest_snapshots(cid)
+    news_cache, news_lock = {}, threading.Lock()
+
+    def news_for(topic):
+        with news_lock:
+            ev = news_cache.get(topic)
+            owner = ev is None
+            if owner: ev = news_cache[topic] = [threading.Event(), []]
+        if owner:
+            try: ev[1] = fetch_automated_news(topic) or []
+            except Exception as e: metrics.error("pdf.portfolio_news", e) # Rapport sans veille plutôt qu'en échec
+            finally: ev[0].set()
+        else: ev[0].wait()
+        return ev[1]
+
+    def prepare(d):
+        if with_news and not d.get('news'): d['news'] = news_for(f"{d['ent_name']} water")
+        return d, create_static_map(d.get('lat'), d.get('lon'))
+
+    def prepared():
+        """(i, site, future) dans l'ordre. Fenêtre bornée : une vignette est lue peu après sa création
+        (pas d'éviction du cache disque entre-temps) et chaque résultat est libéré dès qu'il est consommé."""
+        window = deque()
+        with ThreadPoolExecutor(max_workers=workers) as ex:
+            for i, d in enumerate(sites):
+                window.append((i, d, ex.submit(prepare, d)))
+                if len(window) >= workers * 2: yield window.popleft()
+            while window: yield window.popleft()
+
+    book = mode == "book"
+    pdf = FPDF() if book else None
+    z = None if book else zipfile.ZipFile(out_path, 'w', zipfile.ZIP_DEFLATED)
+    try:
+        for done, (i, d, fut) in enumerate(prepared(), 1):
+            name = f"{i + 1:03d}_{_safe_filename(d['current_site_name'])}"
+            try:
+                d, map_path = fut.result()
+                if book: add_site_report(pdf, d, map_path or "")
+                else:
+                    one = FPDF(); add_site_report(one, d, map_path or "")
+                    z.writestr(f"{name}.pdf", one.output(dest='S').encode('latin-1', 'replace'))
+            except Exception as e:
+                metrics.error("pdf.portfolio_site", e)
+                if book:
+                    pdf.add_page(); pdf.set_font("Arial", 'B', 14)
+                    pdf.multi_cell(0, 10, f"{d.get('current_site_name', 'Site')} : rapport indisponible ({type(e).__name__})")
+                else: z.writestr(f"{name}_ERREUR.txt", f"Rapport indisponible pour {d['current_site_name']} : {type(e).__name__}: {e}\n")
+            if progress: progress(done, len(sites))
+        if book: pdf.output(out_path, 'F')
+    finally:
+        if z: z.close()
+    return out_path
     
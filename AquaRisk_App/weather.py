@@ -0,0 +1,82 @@
+import time
+import threading
+import requests
+import pandas as pd
+import metrics
+
+# ==============================================================================
+# METEO OPEN-METEO : requêtes groupées (plusieurs sites par appel) + cache par coordonnée arrondie
+# ==============================================================================
+METEO_URL = "https://api.open-meteo.com/v1/forecast"   # Remplaçable (serveur local en test)
+METEO_TTL = 15 * 60      # current_weather est mis à jour toutes les 15 min
+METEO_BATCH = 100        # Sites par requête (limite raisonnable de longueur d'URL)
+METEO_PRECISION = 2      # Arrondi des coordonnées (~1 km, bien plus fin que la grille du modèle)
+WEATHER_COLS = ['lat', 'lon', 'temp', 'wind', 'rain_today']
+
+class WeatherProvider:
+    def __init__(self, base_url=METEO_URL, ttl=METEO_TTL, batch=METEO_BATCH, timeout=8):
+        self.base_url, self.ttl, self.batch, self.timeout = base_url, ttl, batch, timeout
+        self.session = requests.Session()
+        self._cache = {} # (lat, lon) arrondis -> (ts, dict)
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0, 'requests': 0, 'errors': 0}
+
+    @staticmethod
+    def _key(lat, lon):
+        return (round(float(lat), METEO_PRECISION), round(float(lon), METEO_PRECISION))
+
+    def _fetch(self, keys):
+        """Une requête pour tout un lot de coordonnées ; Open-Meteo renvoie une liste dans le même ordre"""
+        params = {"latitude": ",".join(str(k[0]) for k in keys), "longitude": ",".join(str(k[1]) for k in keys),
+                  "current_weather": "true", "daily": "temperature_2m_max,precipitation_sum", "forecast_days": 1}
+        self.stats['requests'] += 1
+        r = self.session.get(self.base_url, params=params, timeout=self.timeout)
+        r.raise_for_status()
+        res = r.json()
+        if isinstance(res, dict): res = [res]
+        out = {}
+        for k, d in zip(keys, res):
+            out[k] = {"temp": d['current_weather']['temperature'],
+                      "wind": d['current_weather']['windspeed'],
+                      "rain_today": d['daily']['precipitation_sum'][0] if 'daily' in d else 0}
+        return out
+
+    def get_many(self, coords):
+        """[(lat, lon), ...] -> DataFrame (une ligne par site, dans l'ordre ; NaN si indisponible)"""
+        coords = list(coords)
+        keys = [self._key(lat, lon) for lat, lon in coords]
+        now, found, todo = time.time(), {}, []
+        with self._lock:
+            for k in dict.fromkeys(keys):
+                c = self._cache.get(k)
+                if c and now - c[0] < self.ttl: found[k] = c[1]
+                else: todo.append(k)
+        self.stats['hits'] += len(keys) - len(todo); self.stats['misses'] += len(todo)
+        for i in range(0, len(todo), self.batch):
+            lot = todo[i:i + self.batch]
+            try:
+                with metrics.timer("open_meteo.fetch"): res = self._fetch(lot)
+            except (requests.RequestException, ValueError, KeyError, TypeError):
+                self.stats['errors'] += 1; continue
+            with self._lock:
+                for k, v in res.items(): self._cache[k] = (time.time(), v)
+            found.update(res)
+        rows = [{'lat': lat, 'lon': lon, **found.get(k, {})} for (lat, lon), k in zip(coords, keys)]
+        return pd.DataFrame(rows, columns=WEATHER_COLS)
+
+    def get(self, lat, lon):
+        """Un site -> dict(temp, wind, rain_today) ou None"""
+        row = self.get_many([(lat, lon)]).iloc[0]
+        return None if pd.isna(row['temp']) else {k: row[k].item() if hasattr(row[k], 'item') else row[k] for k in WEATHER_COLS[2:]}
+
+_PROVIDER = None
+_PROVIDER_LOCK = threading.Lock()
+
+def get_weather_provider():
+    global _PROVIDER
+    if _PROVIDER is None:
+        with _PROVIDER_LOCK:
+            if _PROVIDER is None:
+                _PROVIDER = WeatherProvider(base_url=METEO_URL)
+                metrics.register_cache("open_meteo", _PROVIDER.stats)
+    return _PROVIDER
@@ -1,26 +1,20 @@
 import streamlit as st
 import pandas as pd
 import numpy as np
-import pdfplumber
 import re
 import os
 import requests
 import io
-import yfinance as yf
-from fpdf import FPDF
+import json
+import functools
 from datetime import datetime
-import folium
-from streamlit_folium import st_folium
-import xlsxwriter
-import feedparser
-from random import randint
-from thefuzz import process
 
-# On gère l'absence de geopy pour éviter le crash immédiat
-try:
-    from geopy.geocoders import Nominatim
-except ImportError:
-    Nominatim = None
+import sys
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "AquaRisk_App"))
+from geocoding import get_geocoder
+import liasse_ocr
+from news import get_news_watch
+from market_data import get_market_data
 
 # ==============================================================================
 # 1. ARCHITECTURE & CONFIGURATION
@@ -87,78 +81,30 @@ class FinancialEngine:
     @staticmethod
     def clean_number(text_num):
         """Nettoie n'importe quel format de nombre (ex: (10 000) -> -10000.0)"""
-        if not isinstance(text_num, str): return 0.0
-        try:
-            clean = text_num.replace(' ', '').replace(')', '').replace('(', '-').replace("'", "").replace('"', "")
-            clean = re.sub(r'[^\d,\.-]', '', clean).replace(',', '.')
-            if clean.count('.') > 1: clean = clean.replace('.', '', clean.count('.') - 1)
-            return float(clean)
-        except: return 0.0
+        return liasse_ocr.clean_number(text_num)
 
     @staticmethod
     def run_ocr(file_obj):
-        """OCR Robuste : Lit tout et cherche les patterns"""
-        stats = {'ca': 0.0, 'res': 0.0, 'cap': 0.0, 'found': False}
-        full_text = ""
-        
-        try:
-            with pdfplumber.open(file_obj) as pdf:
-                for p in pdf.pages[:30]: 
-                    full_text += (p.extract_text() or "") + "\n"
-            
-            text_upper = full_text.upper()
-            patterns = {
-                'ca': ["CHIFFRES D'AFFAIRES", "PRODUITS D'EXPLOITATION", "VENTES"],
-                'res': ["RESULTAT NET", "BENEFICE OU PERTE", "RESULTAT DE L'EXERCICE"],
-                'cap': ["CAPITAUX PROPRES", "SITUATION NETTE"]
-            }
-
-            for key, keywords in patterns.items():
-                for kw in keywords:
-                    if kw in text_upper:
-                        idx = text_upper.find(kw)
-                        # Fenêtre de recherche large (400 chars après le mot clé)
-                        window = text_upper[idx:idx+400] 
-                        # Regex pour trouver des nombres isolés
-                        nums = re.findall(r'-?\s*(?:\d{1,3}(?:\s\d{3})*|\d+)(?:[\.,]\d+)?', window)
-                        
-                        valid_nums = []
-                        for n in nums:
-                            val = FinancialEngine.clean_number(n)
-                            # Filtre intelligent : on ignore les années (1990-2030) et numéros de page
-                            if abs(val) > 2050 or (abs(val) > 500 and abs(val) < 1900):
-                                valid_nums.append(val)
-                        
-                        if valid_nums:
-                            # Pour le CA on prend le max, pour le reste le premier pertinent
-                            if key == 'ca': stats['ca'] = max(valid_nums, key=abs)
-                            else: stats[key] = valid_nums[0]
-                            stats['found'] = True
-                            break # On passe au pattern suivant
-        except Exception as e:
-            return stats, f"Erreur OCR: {str(e)}", ""
+        """OCR en flux (voir liasse_ocr.run_ocr)"""
+        return liasse_ocr.run_ocr(file_obj)
 
-        return stats, "Succès", full_text
+    @staticmethod
+    def ingest_liasses(files, progress=None):
+        """Import en masse : OCR de plusieurs PDF en parallèle -> DataFrame entreprise / année"""
+        rows = liasse_ocr.ingest_liasses([(f.name, f.getvalue()) for f in files], progress=progress)
+        return pd.DataFrame(rows).sort_values(['entreprise', 'annee'], na_position='last').reset_index(drop=True)
 
     @staticmethod
     def get_yahoo_data(ticker):
-        try:
-            tick = yf.Ticker(ticker)
-            info = tick.info
-            # Fallback fast_info si info est vide
-            mcap = info.get('marketCap') or tick.fast_info.get('market_cap')
-            return mcap if mcap else 0.0, info.get('shortName', ticker)
-        except: return 0.0, "Inconnu"
+        """-> (capitalisation, nom, erreur) via market_data (cache par jour de bourse)"""
+        q = get_market_data().quote(ticker)
+        return q['market_cap'] or 0.0, q['name'], q['error']
 
 class ClimateEngine:
     @staticmethod
     def get_coords(ville, pays):
-        if Nominatim:
-            try:
-                geolocator = Nominatim(user_agent=f"AR_V30_{randint(1,10000)}")
-                loc = geolocator.geocode(f"{ville}, {pays}", timeout=3)
-                if loc: return loc.latitude, loc.longitude
-            except: pass
+        lat, lon, _ = get_geocoder().geocode(ville, pays)
+        if lat is not None: return lat, lon
         return 48.8566, 2.3522 # Paris défaut
 
     @staticmethod
@@ -172,6 +118,7 @@ class ClimateEngine:
 class ReportEngine:
     @staticmethod
     def generate_pdf(data):
+        from fpdf import FPDF # Imports lourds chargés à la première génération (pas au démarrage)
         pdf = FPDF()
         pdf.add_page()
         
@@ -212,6 +159,39 @@ class ReportEngine:
             
         return pdf.output(dest='S').encode('latin-1', 'replace')
 
+# --- MEMOÏSATION DES RAPPORTS ---
+# Clé = JSON canonique des seules entrées utilisées par le rapport : un slider d'un autre onglet
+# ne reconstruit rien. Cache partagé entre sessions et borné.
+PDF_KEYS = ['ent_name', 'valo_finale', 'mode_valo', 'methode_pme', 'ca', 'res', 's24', 's30', 'var_amount', 'news']
+XLS_KEYS = ['ent_name', 'valo_finale', 'ca', 's30', 'var_amount']
+
+def report_payload(data, keys):
+    return json.dumps({k: data[k] for k in keys}, sort_keys=True, default=str)
+
+@st.cache_data(max_entries=64, show_spinner=False)
+def build_pdf(payload):
+    return ReportEngine.generate_pdf(json.loads(payload))
+
+@st.cache_data(max_entries=64, show_spinner=False)
+def build_excel(payload):
+    import xlsxwriter
+    d = json.loads(payload)
+    output = io.BytesIO()
+    workbook = xlsxwriter.Workbook(output, {'in_memory': True})
+    ws = workbook.add_worksheet()
+    data_rows = [
+        ["Indicateur", "Valeur"],
+        ["Entreprise", d['ent_name']],
+        ["Valorisation", d['valo_finale']],
+        ["CA", d['ca']],
+        ["Score 2030", d['s30']],
+        ["VaR", d['var_amount']]
+    ]
+    for i, r in enumerate(data_rows):
+        ws.write_row(i, 0, r)
+    workbook.close()
+    return output.getvalue()
+
 # ==============================================================================
 # 4. INTERFACE UTILISATEUR (FRONTEND)
 # ==============================================================================
@@ -266,6 +246,20 @@ with tab_input:
                     else:
                         st.error("Lecture difficile. Veuillez saisir manuellement.")
             
+            # --- IMPORT EN MASSE (plusieurs années / entreprises) ---
+            with st.expander("📚 Import en masse (plusieurs liasses)"):
+                bulk = st.file_uploader("Liasses fiscales (PDF)", type=['pdf'], accept_multiple_files=True, key="bulk_liasses")
+                if bulk and st.button(f"🧠 Analyser {len(bulk)} documents"):
+                    bar = st.progress(0.0, text="OCR en cours...")
+                    df_bulk = FinancialEngine.ingest_liasses(bulk, progress=lambda d, t: bar.progress(d / t, text=f"{d}/{t} documents"))
+                    st.session_state['bulk_ocr'] = df_bulk
+                if st.session_state.get('bulk_ocr') is not None:
+                    df_bulk = st.session_state['bulk_ocr']
+                    n_err = int((df_bulk['statut'] != "OK").sum())
+                    if n_err: st.warning(f"{n_err} document(s) non exploitable(s).")
+                    st.dataframe(df_bulk, hide_index=True, use_container_width=True)
+                    st.download_button("📥 Exporter CSV", df_bulk.to_csv(index=False).encode('utf-8'), file_name="liasses.csv")
+
             # --- CHAMPS MANUELS (Connectés au State) ---
             st.number_input("Chiffre d'Affaires (€)", key="ca")
             st.number_input("Résultat Net (€)", key="res")
@@ -294,8 +288,8 @@ with tab_input:
         elif mode == "Cotée (Bourse)":
             ticker = st.text_input("Ticker Yahoo (ex: BN.PA)", "BN.PA")
             if st.button("Charger Données Bourse"):
-                mcap, name = FinancialEngine.get_yahoo_data(ticker)
-                if mcap > 0:
+                mcap, name, err = FinancialEngine.get_yahoo_data(ticker)
+                if not err and mcap > 0:
                     st.session_state['valo_finale'] = mcap
                     st.session_state['source_data'] = f"Yahoo ({ticker})"
                     # Estimation CA/Res pour ratios
@@ -303,7 +297,7 @@ with tab_input:
                     st.session_state['res'] = mcap * 0.05
                     st.success(f"Société : {name} | Valo : {mcap:,.0f} €")
                 else:
-                    st.error("Ticker introuvable.")
+                    st.error(f"Ticker introuvable ({err}).")
             st.number_input("Capitalisation (€)", key="valo_finale")
 
         else: # Startup
@@ -336,12 +330,8 @@ with tab_dashboard:
             var = st.session_state['valo_finale'] * (delta_risk / 5.0) * vuln_pct
             st.session_state['var_amount'] = var
             
-            # 4. News
-            try:
-                q = urllib.parse.quote(st.session_state['ent_name'])
-                f = feedparser.parse(f"https://news.google.com/rss/search?q={q}&hl=fr-FR&gl=FR&ceid=FR:fr")
-                st.session_state['news'] = [{"title": e.title, "link": e.link} for e in f.entries[:5]]
-            except: pass
+            # 4. News (cache partagé + requête conditionnelle)
+            st.session_state['news'] = get_news_watch().fetch(st.session_state['ent_name'])[:5]
             
             st.session_state['audit_launched'] = True
 
@@ -360,6 +350,8 @@ with tab_dashboard:
         
         with col_visu1:
             st.subheader("📍 Localisation")
+            import folium # Carte affichée seulement une fois l'audit lancé
+            from streamlit_folium import st_folium
             m = folium.Map(location=[st.session_state['lat'], st.session_state['lon']], zoom_start=11)
             folium.Marker(
                 [st.session_state['lat'], st.session_state['lon']], 
@@ -383,29 +375,16 @@ with tab_docs:
     if st.session_state['audit_launched']:
         c_pdf, c_xls = st.columns(2)
         
+        # Les fichiers ne sont générés qu'au clic (data callable), puis servis depuis le cache
         with c_pdf:
             st.markdown("### Rapport PDF")
-            pdf_data = ReportEngine.generate_pdf(st.session_state)
-            st.download_button("📄 Télécharger le PDF", pdf_data, file_name="Rapport_Audit.pdf", mime="application/pdf")
+            pdf_payload = report_payload(st.session_state, PDF_KEYS)
+            st.download_button("📄 Télécharger le PDF", functools.partial(build_pdf, pdf_payload), file_name="Rapport_Audit.pdf", mime="application/pdf")
             
         with c_xls:
             st.markdown("### Export Excel")
-            # Création Excel en mémoire
-            output = io.BytesIO()
-            workbook = xlsxwriter.Workbook(output, {'in_memory': True})
-            ws = workbook.add_worksheet()
-            data_rows = [
-                ["Indicateur", "Valeur"],
-                ["Entreprise", st.session_state['ent_name']],
-                ["Valorisation", st.session_state['valo_finale']],
-                ["CA", st.session_state['ca']],
-                ["Score 2030", st.session_state['s30']],
-                ["VaR", st.session_state['var_amount']]
-            ]
-            for i, r in enumerate(data_rows):
-                ws.write_row(i, 0, r)
-            workbook.close()
-            st.download_button("📊 Télécharger Excel", output.getvalue(), file_name="Data.xlsx")
+            xls_payload = report_payload(st.session_state, XLS_KEYS)
+            st.download_button("📊 Télécharger Excel", functools.partial(build_excel, xls_payload), file_name="Data.xlsx")
             
         st.markdown("### 📰 Sources Détectées")
         if st.session_state['news']:
@@ -2,10 +2,18 @@
 # PROJET AQUARISK V2 - VERSION LOCALE ROBUSTE
 # ==============================================================================
 
+import os
+import sys
+import json
+import hashlib
 import pandas as pd
 import folium
-from geopy.geocoders import Nominatim
 import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "AquaRisk_App"))
+from geocoding import get_geocoder
+from spatial_index import AqueductIndex, AQUEDUCT_INDEX_DB
 
 print("🚀 DÉMARRAGE DU SYSTÈME AQUARISK (V2)...")
 
@@ -27,20 +35,31 @@ DB_WRI = initialiser_base_donnees()
 print("✅ Base de données chargée.")
 
 # --- 2. LE MOTEUR D'ANALYSE (MODIFIÉ) ---
-# J'ai changé le timeout à 30 secondes et changé le user_agent
-geolocator = Nominatim(user_agent="aquarisk_mac_sweegy_v2", timeout=30)
+# Géocodage inverse via le cache partagé : un site déjà vu ne refait pas d'appel réseau
+geolocator = get_geocoder()
+
+# Index Aqueduct local (construit par setup_map.py) : score exact du bassin, sans réseau
+AQUEDUCT = AqueductIndex(AQUEDUCT_INDEX_DB) if os.path.exists(AQUEDUCT_INDEX_DB) else None
+print("✅ Index Aqueduct chargé." if AQUEDUCT else "ℹ️ Index Aqueduct absent (lancer setup_map.py) : mode géocodage + table WRI.")
 
-def auditer_site(nom_site, lat, lon, ca_expose):
+def auditer_site(nom_site, lat, lon, ca_expose, raise_errors=False):
     print(f"   🔎 Analyse de : {nom_site}...")
+    bassin = AQUEDUCT.lookup(lat, lon) if AQUEDUCT else None
+    if bassin and bassin['score'] is not None:
+        return {
+            "nom": nom_site, "lat": lat, "lon": lon,
+            "region": (bassin['name'] or "Inconnue").title(),
+            "score": round(bassin['score'], 2), "label": bassin['label'], "capital": ca_expose
+        }
     try:
         # On demande l'adresse
-        location = geolocator.reverse(f"{lat}, {lon}", language='en')
+        location = geolocator.reverse(lat, lon, language='en', raise_errors=raise_errors)
         
         if location is None:
             region_detectee = "Inconnue"
             score = 1.0; label = "Low (Défaut)"
         else:
-            address = location.raw['address']
+            address = location.get('address', {})
             region_detectee = address.get('state', address.get('county', 'Inconnue')).lower()
             
             match = DB_WRI[DB_WRI['region'] == region_detectee]
@@ -57,10 +76,71 @@ def auditer_site(nom_site, lat, lon, ca_expose):
             "score": score, "label": label, "capital": ca_expose
         }
     except Exception as e:
+        if raise_errors: raise
         print(f"   ⚠️ Erreur connexion : {e}")
         return None
 
-# --- 3. EXÉCUTION ---
+# --- 3. SCAN CONCURRENT ---
+# Le débit est borné par le TokenBucket du géocodeur (1 req/s Nominatim), pas par des pauses fixes :
+# les sites déjà en cache sont traités instantanément.
+MAX_WORKERS = 8                       # Sites traités en parallèle
+MAX_RETRIES = 3                       # Tentatives par site (backoff exponentiel)
+CHECKPOINT = "scan_checkpoint.jsonl"  # Un résultat par ligne, permet de reprendre un scan interrompu
+
+def signature_portefeuille(sites):
+    """Empreinte du portefeuille : un checkpoint ne sert qu'à reprendre le scan de ce même portefeuille"""
+    return hashlib.sha1(json.dumps(sites, sort_keys=True, ensure_ascii=False).encode()).hexdigest()
+
+def charger_checkpoint(path, sig):
+    """Index du site dans le portefeuille signé -> résultat (deux sites peuvent porter le même nom)"""
+    done = {}
+    if path and os.path.exists(path):
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                try:
+                    r = json.loads(line)
+                    if r['sig'] == sig: done[int(r['i'])] = r['res']
+                except (ValueError, KeyError, TypeError): pass # Ligne tronquée (arrêt brutal) ou ancien format
+    return done
+
+def scanner_portefeuille(sites, workers=MAX_WORKERS, retries=MAX_RETRIES, checkpoint=CHECKPOINT):
+    """Le checkpoint est supprimé une fois le scan terminé sans échec : le scan suivant repart de zéro
+    (scores rafraîchis, ex. après construction de aqueduct_index.db)."""
+    sig = signature_portefeuille(sites)
+    done = charger_checkpoint(checkpoint, sig)
+    todo = [i for i in range(len(sites)) if i not in done]
+    if done: print(f"   ↩️ Reprise : {len(sites) - len(todo)} sites déjà traités, {len(todo)} restants.")
+
+    def traiter(site):
+        for essai in range(1, retries + 1):
+            try: return auditer_site(site['nom'], site['lat'], site['lon'], site['ca'], raise_errors=True)
+            except Exception as e:
+                if essai == retries:
+                    print(f"   ⚠️ Échec {site['nom']} après {retries} essais : {e}")
+                    return None
+                time.sleep(0.5 * 2 ** (essai - 1))
+
+    n_ok, n_fail = 0, 0
+    ck = open(checkpoint, 'a', encoding='utf-8') if checkpoint else None
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as ex:
+            futures = {ex.submit(traiter, sites[k]): k for k in todo}
+            for i, fut in enumerate(as_completed(futures), 1):
+                res = fut.result()
+                if res:
+                    n_ok += 1
+                    done[futures[fut]] = res
+                    if ck: ck.write(json.dumps({'sig': sig, 'i': futures[fut], 'res': res}, ensure_ascii=False) + "\n"); ck.flush()
+                    print(f"      -> Succès : Région {res['region']} détectée.")
+                else: n_fail += 1
+                print(f"   [{i}/{len(todo)}] {n_ok} OK, {n_fail} échecs")
+    finally:
+        if ck: ck.close()
+    if checkpoint and n_fail == 0 and os.path.exists(checkpoint): os.remove(checkpoint)
+    # Résultats dans l'ordre du portefeuille
+    return [done[k] for k in range(len(sites)) if k in done]
+
+# --- 4. EXÉCUTION ---
 portefeuille = [
     {"nom": "Rio Tinto (Mine Oyu Tolgoi)", "lat": 43.011, "lon": 106.873, "ca": "12 Mrd $"},
     {"nom": "Tesla (Giga Berlin)", "lat": 52.397, "lon": 13.794, "ca": "20 Mrd $"},
@@ -68,17 +148,10 @@ portefeuille = [
 {"nom": "Apple (Data Center)", "lat": 39.54, "lon": -119.81, "ca": "Unknown"}
 ]
 
-resultats = []
-print("\n🔄 SCAN EN COURS (Patience, le serveur peut être lent)...")
-
-for site in portefeuille:
-    res = auditer_site(site['nom'], site['lat'], site['lon'], site['ca'])
-    if res: 
-        resultats.append(res)
-        print(f"      -> Succès : Région {res['region']} détectée.")
-    time.sleep(2) # Pause de 2 secondes entre chaque requête
+print("\n🔄 SCAN EN COURS...")
+resultats = scanner_portefeuille(portefeuille)
 
-# --- 4. CARTE ---
+# --- 5. CARTE ---
 print("\n🗺️ GÉNÉRATION DE LA CARTE...")
 carte = folium.Map(location=[25, 0], zoom_start=2, tiles='cartodbpositron')
 
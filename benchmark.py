@@ -0,0 +1,462 @@
+# ==============================================================================
+# AQUARISK - BENCHMARKS HORS-LIGNE
+# Portefeuilles synthétiques (schéma aquarisk_v80.db), liasses PDF générées, serveurs
+# locaux à la place de Nominatim / Open-Meteo / Google News / tuiles OSM.
+#   python benchmark.py                          -> bench_results.json
+#   python benchmark.py --sizes 1000,10000,100000 --out run.json --compare bench_results.json
+#   python benchmark.py --only imports           -> échoue si un import lourd revient au démarrage
+#   python benchmark.py --only pappers,market    -> échoue si un client de données régresse (cache, erreurs, retry)
+#   python benchmark.py --only download          -> échoue si setup_map.telecharger régresse (reprise, checksum)
+# ==============================================================================
+
+import os
+import sys
+import io
+import json
+import time
+import shutil
+import sqlite3
+import argparse
+import platform
+import tempfile
+import threading
+import statistics
+import subprocess
+from collections import Counter
+from datetime import datetime, timedelta
+from urllib.parse import urlparse, parse_qs
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+import numpy as np
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+APP_DIR = os.path.join(ROOT, "AquaRisk_App")
+sys.path.insert(0, APP_DIR)
+
+SIZES = [1000, 10000, 100000]
+SITES_PER_CLIENT = 1000
+AUDITS_PER_SITE = 2
+# Dépendances lourdes qui ne doivent pas être chargées par un simple import / premier rendu
+HEAVY_MODULES = ['pdfplumber', 'yfinance', 'folium', 'streamlit_folium', 'xlsxwriter', 'feedparser', 'thefuzz',
+                 'geopy', 'matplotlib', 'staticmap', 'fpdf']
+IMPORT_TARGETS = {
+    'import utils': "import utils",
+    'first render app.py': f"from streamlit.testing.v1 import AppTest; AppTest.from_file({os.path.join(ROOT, 'app.py')!r}, default_timeout=120).run()",
+    'first render Home.py': f"from streamlit.testing.v1 import AppTest; AppTest.from_file({os.path.join(APP_DIR, 'Home.py')!r}, default_timeout=120).run()",
+}
+VILLES = [("Lyon", "France"), ("Hambourg", "Allemagne"), ("Austin", "USA"), ("Pune", "Inde"), ("Lima", "Pérou")]
+
+# --- 1. SERVEUR LOCAL (Nominatim, Open-Meteo, RSS, tuiles, Pappers, archive Aqueduct) ---
+RSS_ITEM = "<item><title>Site {i} : alerte sécheresse</title><link>http://localhost/{i}</link><pubDate>Mon, 06 Jan 2025 10:00:00 GMT</pubDate></item>"
+RSS = ('<?xml version="1.0"?><rss version="2.0"><channel><title>stub</title>'
+       + "".join(RSS_ITEM.format(i=i) for i in range(10)) + "</channel></rss>").encode()
+
+# Pappers : SIREN -> nom ; une requête commençant par "QUOTA" reçoit d'abord un 429, la clé "invalide" un 401
+PAPPERS_COMPANIES = {f"{100000000 + i}": f"SOCIETE {i}" for i in range(100)}
+PAPPERS_BAD_KEY = "invalide"
+# Archive servie par /archive.zip (HTTP Range) et /archive-norange.zip (Range ignoré, toujours 200)
+ARCHIVE = np.random.default_rng(7).integers(0, 256, 3 * 1024 * 1024 + 123, dtype=np.uint8).tobytes()
+
+def _tile_png():
+    from PIL import Image
+    buf = io.BytesIO(); Image.new('RGB', (256, 256), (200, 220, 240)).save(buf, format='PNG')
+    return buf.getvalue()
+
+class StubHandler(BaseHTTPRequestHandler):
+    tile = None
+    hits = Counter() # (chemin, requête) -> nombre d'appels reçus (vérifie ce qui est servi par les caches)
+
+    def log_message(self, *args): pass
+
+    def _send(self, code, body=b"", ctype="application/json", headers=None):
+        self.send_response(code)
+        self.send_header("Content-Type", ctype); self.send_header("Content-Length", str(len(body)))
+        for k, v in (headers or {}).items(): self.send_header(k, v)
+        self.end_headers(); self.wfile.write(body)
+
+    def do_GET(self):
+        u = urlparse(self.path); q = {k: v[0] for k, v in parse_qs(u.query).items()}
+        if u.path == "/search":
+            h = sum(map(ord, q.get('q', ""))) % 90
+            self._send(200, json.dumps([{'lat': str(h - 45), 'lon': str(h * 2 - 90), 'display_name': q.get('q')}]).encode())
+        elif u.path == "/reverse":
+            self._send(200, json.dumps({'display_name': "stub", 'address': {'state': "Rhône-Alpes", 'country': "France"}}).encode())
+        elif u.path == "/forecast":
+            n = len(q.get('latitude', "0").split(","))
+            one = {'current_weather': {'temperature': 21.5, 'windspeed': 12.0}, 'daily': {'precipitation_sum': [0.4]}}
+            self._send(200, json.dumps(one if n == 1 else [one] * n).encode())
+        elif u.path == "/rss":
+            if self.headers.get('If-None-Match') == '"stub"': return self._send(304)
+            self._send(200, RSS, "application/rss+xml", {'ETag': '"stub"'})
+        elif u.path.startswith("/tiles/"):
+            self._send(200, StubHandler.tile, "image/png")
+        elif u.path.startswith("/pappers/"): self._pappers(u.path[len("/pappers/"):], q)
+        elif u.path in ("/archive.zip", "/archive-norange.zip"): self._archive(u.path == "/archive.zip")
+        else: self._send(404)
+
+    def _archive(self, ranges):
+        rng = self.headers.get('Range')
+        StubHandler.hits[("archive", rng)] += 1
+        if not (ranges and rng): return self._send(200, ARCHIVE, "application/zip")
+        start = int(rng.split("=")[1].split("-")[0])
+        if start >= len(ARCHIVE): return self._send(416, headers={'Content-Range': f"bytes */{len(ARCHIVE)}"})
+        self._send(206, ARCHIVE[start:], "application/zip", {'Content-Range': f"bytes {start}-{len(ARCHIVE) - 1}/{len(ARCHIVE)}"})
+
+    def _pappers(self, path, q):
+        key = (path, q.get('q') or q.get('siren'))
+        StubHandler.hits[key] += 1
+        if self.headers.get('api-key') == PAPPERS_BAD_KEY: return self._send(401)
+        if str(key[1]).startswith("QUOTA") and StubHandler.hits[key] == 1: return self._send(429, headers={'Retry-After': "0"})
+        if path == "recherche":
+            name = str(key[1]).upper().replace("QUOTA ", "")
+            hit = [{'siren': s, 'nom_entreprise': n} for s, n in PAPPERS_COMPANIES.items() if n == name]
+            self._send(200, json.dumps({'resultats': hit[:1]}).encode())
+        elif path == "entreprise" and key[1] in PAPPERS_COMPANIES:
+            i = int(key[1]) - 100000000
+            fin = {'chiffre_affaires': 1e6 * (i + 1), 'resultat': 1e5 * (i + 1), 'capitaux_propres': 5e5, 'excedent_brut_exploitation': 2e5}
+            self._send(200, json.dumps({'nom_entreprise': PAPPERS_COMPANIES[key[1]], 'finances': [fin]}).encode())
+        else: self._send(404)
+
+def start_stubs():
+    StubHandler.tile = _tile_png()
+    srv = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    return srv, f"http://127.0.0.1:{srv.server_address[1]}"
+
+def wire_services(base, workdir):
+    """Remplace les singletons partagés par des instances pointant vers le serveur local (sans limiteur de débit)"""
+    import geocoding, weather, news, map_cache
+    geocoding._GEOCODER = geocoding.Geocoder(cache_path=os.path.join(workdir, "geocache.db"), base_url=base)
+    weather._PROVIDER = weather.WeatherProvider(base_url=f"{base}/forecast")
+    news._WATCH = news.NewsWatch(base_url=f"{base}/rss", ttl=0) # ttl=0 : chaque appel passe par le 304
+    map_cache._RENDERER = map_cache.MapRenderer(cache_dir=os.path.join(workdir, "maps"), tile_url=base + "/tiles/{z}/{x}/{y}.png")
+
+# --- 2. FIXTURES ---
+def build_portfolio(path, n_sites, audits_per_site=AUDITS_PER_SITE, seed=42):
+    """Base au schéma utils.SCHEMA : n_sites répartis en clients de SITES_PER_CLIENT sites"""
+    import utils
+    rng = np.random.default_rng(seed)
+    conn = sqlite3.connect(path)
+    for q in utils.SCHEMA: conn.execute(q)
+    n_clients = max(1, -(-n_sites // SITES_PER_CLIENT))
+    conn.executemany("INSERT INTO clients (id, name, secteur, date_creation) VALUES (?, ?, ?, ?)",
+                     [(c + 1, f"Client {c + 1:04d}", utils.SECTEURS_LISTE[c % len(utils.SECTEURS_LISTE)], "2024-01-01") for c in range(n_clients)])
+    lat, lon = rng.uniform(-60, 70, n_sites), rng.uniform(-180, 180, n_sites)
+    conn.executemany("INSERT INTO sites (id, client_id, name, pays, ville, lat, lon, activite) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                     [(i + 1, i // SITES_PER_CLIENT + 1, f"Site {i + 1}", VILLES[i % 5][1], VILLES[i % 5][0], float(lat[i]), float(lon[i]), "Usine")
+                      for i in range(n_sites)])
+    base = datetime(2024, 1, 1)
+    cols = ['site_id', 'date'] + utils.AUDIT_COLS + ['extras_json']
+    rows = []
+    for i in range(n_sites):
+        for a in range(audits_per_site):
+            d = {c: None for c in utils.AUDIT_COLS}
+            d.update({'ent_name': f"Client {i // SITES_PER_CLIENT + 1:04d}", 'site_name': f"Site {i + 1}",
+                      'secteur': utils.SECTEURS_LISTE[i % len(utils.SECTEURS_LISTE)], 'lat': float(lat[i]), 'lon': float(lon[i]),
+                      'valo': float(rng.uniform(1e6, 1e9)), 'score_global': float(rng.uniform(1, 5)),
+                      'var_amount': float(rng.uniform(0, 1e7)), 'pression_legale': 50.0, 'risque_image': 50.0, 'reut_invest': 0})
+            rows.append((i + 1, (base + timedelta(days=30 * a + i % 30)).strftime("%Y-%m-%d %H:%M"),
+                         *[d[c] for c in utils.AUDIT_COLS], json.dumps({'wiki_summary': "Pas de données."})))
+    conn.executemany(f"INSERT INTO audits ({', '.join(cols)}) VALUES ({', '.join('?' * len(cols))})", rows)
+    conn.commit(); conn.close()
+
+def make_liasse(n_pages=12, found_on=3, seed=0, secondary_on=None):
+    """Liasse fiscale synthétique : mots clés de l'OCR à la page found_on, remplissage ailleurs.
+    secondary_on : page portant les mots clés moins prioritaires (VENTES, BENEFICE OU PERTE, SITUATION NETTE)."""
+    from fpdf import FPDF
+    rng = np.random.default_rng(seed)
+    pdf = FPDF(); pdf.set_font("Arial", '', 10)
+    for p in range(1, n_pages + 1):
+        pdf.add_page()
+        pdf.cell(0, 8, f"EXERCICE CLOS LE 31/12/2023 - Page {p}", ln=1)
+        if p == found_on:
+            pdf.cell(0, 8, f"CHIFFRES D'AFFAIRES NETS {int(rng.integers(1e6, 1e8)):,}".replace(",", " "), ln=1)
+            pdf.cell(0, 8, f"RESULTAT NET {int(rng.integers(1e4, 1e6)):,}".replace(",", " "), ln=1)
+            pdf.cell(0, 8, f"CAPITAUX PROPRES {int(rng.integers(1e5, 1e7)):,}".replace(",", " "), ln=1)
+        if p == secondary_on:
+            for kw in ("VENTES", "BENEFICE OU PERTE", "SITUATION NETTE"):
+                pdf.cell(0, 8, f"{kw} {int(rng.integers(1e4, 1e6)):,}".replace(",", " "), ln=1)
+        for _ in range(40):
+            pdf.cell(0, 5, f"Compte {int(rng.integers(100000, 999999))}  {int(rng.integers(1000, 99999)):,}".replace(",", " "), ln=1)
+    return pdf.output(dest='S').encode('latin-1')
+
+def sample_session(i=0):
+    import utils
+    return {'ent_name': f"Client {i}", 'current_site_name': f"Site {i}", 'secteur': utils.SECTEURS_LISTE[i % 10],
+            'ville': "Lyon", 'pays': "France", 'lat': 45.76, 'lon': 4.83, 'valo_finale': 25e6, 'ca': 1e7, 'res': 5e5,
+            'cap': 3e6, 'ebitda': 1e6, 'score_global': 3.1, 'score_physique': 1.2, 'score_reglementaire': 1.3,
+            'score_reputation': 0.25, 'score_resilience': 0.5, 'var_amount': 8e5, 'reut_invest': False,
+            'part_fournisseur_risk': 30.0, 'pression_legale': 50, 'risque_image': 50, 'mode_valo': "PME (Multiples)",
+            'weather_info': {'temp': 21.5, 'wind': 12.0}, 'news': [{'title': f"Actualité {k}", 'link': "#", 'date': ""} for k in range(5)]}
+
+# --- 3. MESURE ---
+class Bench:
+    def __init__(self, repeat):
+        self.repeat, self.results = repeat, []
+
+    def run(self, name, fn, n=None, repeat=None, setup=None, **meta):
+        times = []
+        for _ in range(repeat or self.repeat):
+            if setup: setup()
+            t = time.perf_counter(); fn(); times.append(time.perf_counter() - t)
+        r = {'name': name, 'n': n, 'repeat': len(times), 'min': min(times), 'median': statistics.median(times),
+             'mean': statistics.fmean(times), 'max': max(times), **meta}
+        if n: r['per_item_us'] = r['median'] / n * 1e6
+        self.results.append(r)
+        print(f"  {name:<40} n={n or '-':<8} median={r['median'] * 1000:10.2f} ms")
+        return r
+
+def bench_scoring(b, sizes):
+    import utils
+    params = {'pression_legale': 50, 'risque_image': 50}
+    for n in sizes:
+        rng = np.random.default_rng(n)
+        sites = {'lat': rng.uniform(-60, 70, n), 'secteur': [utils.SECTEURS_LISTE[i % 10] for i in range(n)],
+                 'reut_invest': rng.random(n) < 0.3, 'part_fournisseur_risk': rng.uniform(0, 100, n), 'valo_finale': rng.uniform(1e6, 1e9, n)}
+        rows = [{k: v[i] for k, v in sites.items()} for i in range(n)]
+        b.run("scoring.calculate_bloomberg_score", lambda: [utils.calculate_bloomberg_score(r, params) for r in rows], n=n)
+        b.run("scoring.calculate_portfolio_scores", lambda: utils.calculate_portfolio_scores(sites, params), n=n)
+
+def bench_db(b, sizes, workdir):
+    import utils
+    for n in sizes:
+        path = os.path.join(workdir, f"portfolio_{n}.db")
+        b.run("db.build_fixture", lambda: build_portfolio(path, n), n=n, repeat=1)
+        utils.DB_NAME = path
+        utils.init_db()
+        cid = max(1, n // SITES_PER_CLIENT // 2) # Un client au milieu de la base
+        b.run("db.get_clients", utils.get_clients, n=n)
+        b.run("db.get_sites (cache vide)", lambda: utils.get_sites(cid), n=n, setup=utils._read_sql.clear)
+        b.run("db.get_sites", lambda: utils.get_sites(cid), n=n)
+        b.run("db.count_sites", lambda: utils.count_sites(cid), n=n)
+        b.run("db.get_sites_with_history", lambda: utils.get_sites_with_history(cid, limit=20, offset=0), n=n)
+        sid = (cid - 1) * SITES_PER_CLIENT + 1
+        b.run("db.get_site_history", lambda: utils.get_site_history(sid), n=n)
+        b.run("db.save_audit_snapshot x100", lambda: [utils.save_audit_snapshot(sid, sample_session(k)) for k in range(100)], n=n)
+        last = utils.get_site_history(sid)['id'].iloc[0]
+        b.run("db.load_audit_to_session", lambda: utils.load_audit_to_session(int(last)), n=n)
+        b.run("db.get_latest_snapshots", lambda: utils.get_latest_snapshots(cid), n=n)
+        b.run("db.get_portfolio_summary", lambda: utils.get_portfolio_summary(cid), n=n)
+        b.run("map.portfolio_map_html (cache vide)", lambda: utils.get_portfolio_map_html(cid), n=n,
+              setup=lambda: (utils._portfolio_geojson.clear(), utils._portfolio_map_html.clear()))
+        b.run("map.portfolio_map_html", lambda: utils.get_portfolio_map_html(cid), n=n)
+        b.run("db.export_portfolio_excel", lambda: utils.export_portfolio_excel(os.path.join(workdir, "export.xlsx")), n=n, repeat=1)
+        utils.get_pool(path).close()
+
+def ocr_reference(data):
+    """OCR d'origine : texte complet puis, par champ, premier mot-clé (par priorité) qui donne une valeur"""
+    import pdfplumber, liasse_ocr
+    with pdfplumber.open(io.BytesIO(data)) as pdf:
+        text = "".join((p.extract_text() or "") + "\n" for p in pdf.pages[:liasse_ocr.OCR_MAX_PAGES]).upper()
+    stats = {'ca': 0.0, 'res': 0.0, 'cap': 0.0}
+    for key, kws in liasse_ocr.OCR_PATTERNS.items():
+        for kw in kws:
+            idx = text.find(kw)
+            val = liasse_ocr.extract_value(key, text[idx:idx + liasse_ocr.OCR_WINDOW]) if idx >= 0 else None
+            if val is not None: stats[key] = val; break
+    return stats
+
+def bench_ocr(b, workdir):
+    """Renvoie la liste des liasses dont l'OCR en flux diffère de l'OCR sur texte complet"""
+    import liasse_ocr
+    # Mots clés secondaires avant, après ou sans les principaux : la priorité des mots clés doit primer sur l'ordre des pages
+    checks = {"secondaires p1, principaux p8": make_liasse(12, 8, seed=2, secondary_on=1),
+              "secondaires p9, principaux p2": make_liasse(12, 2, seed=3, secondary_on=9),
+              "secondaires seuls p4": make_liasse(12, None, seed=4, secondary_on=4)}
+    failures = []
+    for name, data in checks.items():
+        got, ref = liasse_ocr.run_ocr(io.BytesIO(data))[0], ocr_reference(data)
+        if any(got[k] != ref[k] for k in ref): failures.append(f"ocr : {name} ({got} != {ref})")
+    docs = {(12, 3): make_liasse(12, 3), (30, 28): make_liasse(30, 28, seed=1)}
+    for (pages, at), data in docs.items():
+        b.run(f"ocr.run_ocr ({pages}p, page {at})", lambda: liasse_ocr.run_ocr(io.BytesIO(data)), n=1, pages=pages)
+    batch = [(f"Societe_{i}_2023.pdf", make_liasse(12, 1 + i % 10, seed=i)) for i in range(16)]
+    b.run("ocr.ingest_liasses (16 docs)", lambda: liasse_ocr.ingest_liasses(batch), n=len(batch), repeat=1)
+    return failures
+
+def bench_reports(b, workdir):
+    import utils, map_cache
+    data = sample_session()
+    cold = lambda: shutil.rmtree(map_cache.get_renderer().thumbs.dir, ignore_errors=True) or os.makedirs(map_cache.get_renderer().thumbs.dir)
+    b.run("pdf.generate_pdf_report (vignette froide)", lambda: utils.generate_pdf_report(data), n=1, setup=cold)
+    b.run("pdf.generate_pdf_report (vignette en cache)", lambda: utils.generate_pdf_report(data), n=1)
+    b.run("excel.generate_excel", lambda: utils.generate_excel(data), n=1)
+
+def bench_services(b):
+    import utils
+    villes = [(f"Ville{i}", "France") for i in range(200)]
+    b.run("geo.geocode (200, froid)", lambda: [utils.get_gps_coordinates(v, p) for v, p in villes], n=200, repeat=1)
+    b.run("geo.geocode (200, cache)", lambda: [utils.get_gps_coordinates(v, p) for v, p in villes], n=200)
+    import pandas as pd, weather
+    rng = np.random.default_rng(0)
+    sites = pd.DataFrame({'lat': rng.uniform(-60, 70, 1000), 'lon': rng.uniform(-180, 180, 1000)})
+    b.run("meteo.get_weather_many (1000, froid)", lambda: utils.get_weather_many(sites), n=1000, repeat=1)
+    b.run("meteo.get_weather_many (1000, cache)", lambda: utils.get_weather_many(sites), n=1000)
+    import news
+    topics = [f"Client {i} water" for i in range(20)]
+    b.run("news.fetch_many (20 sujets)", lambda: news.get_news_watch().fetch_many(topics), n=20)
+
+def bench_pappers(b, base, workdir):
+    """Client Pappers contre le serveur local. Renvoie la liste des vérifications en échec."""
+    import pappers
+    url, hits, failures = f"{base}/pappers", StubHandler.hits, []
+    def check(name, ok):
+        if not ok: failures.append(f"pappers : {name}")
+    c = pappers.PappersClient("cle", base_url=url, cache_path=os.path.join(workdir, "pappers.db"))
+
+    stats, nom = c.get_financials("Societe 1")
+    check("recherche + entreprise", nom == "SOCIETE 1" and stats == {'ca': 2e6, 'res': 2e5, 'cap': 5e5, 'ebitda': 2e5})
+    before = sum(hits.values())
+    check("cache SIREN", c.get_financials("  societe 1 ") == (stats, nom) and sum(hits.values()) == before)
+    check("SIREN saisi directement", c.get_financials("100 000 002")[1] == "SOCIETE 2" and hits[("recherche", "100000002")] == 0)
+    check("introuvable", c.get_financials("Inconnue SA") == (None, "Introuvable"))
+    c.get_financials("Inconnue SA")
+    check("cache négatif", hits[("recherche", "Inconnue SA")] == 1)
+    check("SIREN inconnu (404)", c.get_financials("999999999") == (None, "Introuvable"))
+    check("retry sur 429", c.get_financials("QUOTA Societe 3")[1] == "SOCIETE 3" and hits[("recherche", "QUOTA Societe 3")] == 2)
+    bad = pappers.PappersClient(PAPPERS_BAD_KEY, base_url=url, cache_path=os.path.join(workdir, "pappers_bad.db"))
+    check("clé invalide (401)", bad.get_financials("Societe 4") == (None, "Clé API invalide"))
+
+    names = [f"Societe {i}" for i in range(10, 60)]
+    rows = c.bulk(names + ["societe 10", " ", "Inconnue SA"])
+    check("bulk", len(rows) == 52 and sum(r['statut'] == "OK" for r in rows) == 51 and rows[-1]['statut'] == "Introuvable")
+
+    fresh = lambda: pappers.PappersClient("cle", base_url=url, cache_path=os.path.join(workdir, "pappers_bulk.db"))
+    cold = lambda: os.path.exists(os.path.join(workdir, "pappers_bulk.db")) and os.remove(os.path.join(workdir, "pappers_bulk.db"))
+    b.run("pappers.bulk (50, froid)", lambda: fresh().bulk(names), n=50, setup=cold)
+    b.run("pappers.bulk (50, cache)", lambda: fresh().bulk(names), n=50)
+    return failures
+
+def bench_market(b, workdir):
+    """Cotations en lot (FixtureProvider) : un ticker valide et un ticker en échec dans le même appel.
+    Renvoie la liste des vérifications en échec."""
+    import market_data
+    data = {f"T{i}": {'price': 10.0 + i, 'shares': 1e6, 'name': f"Société {i}", 'sector': "Industrie", 'currency': "EUR"} for i in range(500)}
+    failures = []
+    md = market_data.MarketData(market_data.FixtureProvider(data), cache_path=os.path.join(workdir, "market.db"))
+    df = md.quotes(["T1", "INCONNU"])
+    ok, ko = df.iloc[0], df.iloc[1]
+    # 'error' doit valoir None (pas NaN, vrai en booléen) pour un succès, quel que soit le dtype texte de pandas
+    if not (ok['error'] is None and ok['market_cap'] == 11e6 and not df['error'].notna().iloc[0]): failures.append("cotation valide marquée en échec")
+    if not (ko['error'] and df['error'].notna().iloc[1]): failures.append("ticker inconnu non signalé")
+    tickers = list(data) + ["INCONNU"]
+    b.run("market.quotes (501, froid)", lambda: market_data.MarketData(market_data.FixtureProvider(data), cache_path=os.path.join(workdir, "market_bench.db")).quotes(tickers),
+          n=501, repeat=1)
+    b.run("market.quotes (501, cache)", lambda: md.quotes(tickers), n=501)
+    return failures
+
+def bench_download(b, base, workdir):
+    """setup_map.telecharger contre le serveur local : reprise Range, serveur sans Range, checksum. Renvoie les échecs."""
+    import hashlib, contextlib
+    import setup_map
+    sha, hits, failures = hashlib.sha256(ARCHIVE).hexdigest(), StubHandler.hits, []
+    dest = os.path.join(workdir, "Aqueduct30.zip"); part = dest + ".part"
+    def reset(partial=None):
+        for f in (dest, part):
+            if os.path.exists(f): os.remove(f)
+        if partial is not None:
+            with open(part, 'wb') as f: f.write(partial)
+    def fetch(url, expected=sha):
+        with contextlib.redirect_stdout(io.StringIO()): return setup_map.telecharger(url, dest, expected)
+    def content():
+        with open(dest, 'rb') as f: return f.read()
+    def check(name, url, partial):
+        reset(partial)
+        try:
+            if fetch(url) == sha and content() == ARCHIVE and not os.path.exists(part): return True
+        except (OSError, ValueError) as e: name += f" ({type(e).__name__})"
+        failures.append(f"download : {name}")
+
+    if check("reprise (Range)", f"{base}/archive.zip", ARCHIVE[:1024 * 1024]) and hits[("archive", f"bytes={1024 * 1024}-")] != 1:
+        failures.append("download : reprise sans en-tête Range")
+    check("partiel déjà complet (416)", f"{base}/archive.zip", ARCHIVE)
+    # Partiel étranger : le serveur ignore Range, le fichier doit être réécrit et non complété
+    check("serveur sans Range", f"{base}/archive-norange.zip", b"x" * 1024 * 1024)
+    reset()
+    try: fetch(f"{base}/archive.zip", expected="0" * 64); failures.append("download : checksum invalide accepté")
+    except ValueError:
+        if os.path.exists(dest) or os.path.exists(part): failures.append("download : fichier conservé malgré un checksum invalide")
+    b.run("download.telecharger (3 Mo)", lambda: fetch(f"{base}/archive.zip"), n=1, setup=reset)
+    return failures
+
+def bench_imports(b, workdir):
+    """Démarrage à froid : chaque mesure dans un nouvel interpréteur. Renvoie les dépendances lourdes chargées à tort."""
+    offenders = {}
+    for name, stmt in IMPORT_TARGETS.items():
+        code = (f"import sys, time, json\nt = time.perf_counter()\nsys.path.insert(0, {APP_DIR!r})\n{stmt}\n"
+                f"print(json.dumps({{'s': time.perf_counter() - t, 'heavy': sorted(m for m in {HEAVY_MODULES!r} if m in sys.modules)}}))")
+        runs = []
+        def once():
+            out = subprocess.run([sys.executable, "-c", code], cwd=workdir, capture_output=True, text=True, check=True).stdout
+            runs.append(json.loads(out.strip().splitlines()[-1]))
+        r = b.run(f"startup.{name}", once, n=1)
+        # Temps vu par le processus (hors lancement de l'interpréteur), plus stable que le temps du subprocess
+        r.update({'process_median': statistics.median(x['s'] for x in runs), 'heavy_loaded': runs[-1]['heavy']})
+        if runs[-1]['heavy']: offenders[name] = runs[-1]['heavy']
+    return offenders
+
+def bench_home(b, sizes, workdir):
+    import utils
+    from streamlit.testing.v1 import AppTest
+    for n in sizes:
+        utils.DB_NAME = os.path.join(workdir, f"portfolio_{n}.db")
+        if not os.path.exists(utils.DB_NAME): build_portfolio(utils.DB_NAME, n)
+        b.run("home.AppTest render", lambda: AppTest.from_file(os.path.join(APP_DIR, "Home.py"), default_timeout=120).run(), n=n)
+        utils.get_pool(utils.DB_NAME).close()
+
+# --- 4. RÉSULTATS ---
+def meta(args):
+    try: commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True).stdout.strip()
+    except OSError: commit = None
+    return {'date': datetime.now().isoformat(timespec='seconds'), 'commit': commit, 'python': platform.python_version(),
+            'platform': platform.platform(), 'cpu_count': os.cpu_count(), 'sizes': args.sizes, 'repeat': args.repeat}
+
+def compare(results, ref_path):
+    """Médiane actuelle / médiane de référence, par (nom, n)"""
+    with open(ref_path) as f: ref = {(r['name'], r['n']): r for r in json.load(f)['results']}
+    print(f"\n{'Benchmark':<40} {'n':>8} {'ref ms':>10} {'ms':>10} {'ratio':>7}")
+    for r in results:
+        o = ref.get((r['name'], r['n']))
+        if o: print(f"{r['name']:<40} {r['n'] or '-':>8} {o['median'] * 1000:10.2f} {r['median'] * 1000:10.2f} {r['median'] / o['median']:7.2f}")
+
+def main():
+    ap = argparse.ArgumentParser(description="Benchmarks AquaRisk hors-ligne")
+    ap.add_argument("--sizes", default=",".join(map(str, SIZES)), type=lambda s: [int(x) for x in s.split(",")])
+    ap.add_argument("--repeat", type=int, default=3)
+    ap.add_argument("--only", default="imports,scoring,db,ocr,reports,services,pappers,market,download,home", help="Groupes à lancer (séparés par des virgules)")
+    ap.add_argument("--out", default="bench_results.json")
+    ap.add_argument("--compare", help="JSON d'un run précédent")
+    args = ap.parse_args()
+    out_path, ref_path = os.path.abspath(args.out), args.compare and os.path.abspath(args.compare)
+
+    workdir = tempfile.mkdtemp(prefix="aquarisk_bench_")
+    os.chdir(workdir) # Les caches (aquarisk_*.db) du run restent dans le dossier temporaire
+    srv, base = start_stubs()
+    wire_services(base, workdir)
+    b, only = Bench(args.repeat), set(args.only.split(","))
+    offenders, failures = {}, []
+    try:
+        if 'imports' in only: print("Démarrage à froid"); offenders = bench_imports(b, workdir)
+        if 'scoring' in only: print("Scoring"); bench_scoring(b, args.sizes)
+        if 'db' in only: print("Base de données"); bench_db(b, args.sizes, workdir)
+        if 'ocr' in only: print("OCR"); failures += bench_ocr(b, workdir)
+        if 'reports' in only: print("Rapports"); bench_reports(b, workdir)
+        if 'services' in only: print("Services (stubs locaux)"); bench_services(b)
+        if 'pappers' in only: print("Pappers (serveur local)"); failures += bench_pappers(b, base, workdir)
+        if 'market' in only: print("Données de marché (fixtures)"); failures += bench_market(b, workdir)
+        if 'download' in only: print("Téléchargement Aqueduct (serveur local)"); failures += bench_download(b, base, workdir)
+        if 'home' in only: print("Home.py (AppTest)"); bench_home(b, args.sizes, workdir)
+    finally:
+        srv.shutdown()
+        os.chdir(ROOT); shutil.rmtree(workdir, ignore_errors=True)
+
+    with open(out_path, "w") as f: json.dump({'meta': meta(args), 'results': b.results}, f, indent=2)
+    print(f"\n✅ {len(b.results)} mesures -> {out_path}")
+    if ref_path: compare(b.results, ref_path)
+    if offenders:
+        # Régression : une dépendance lourde est de nouveau importée au démarrage
+        for name, mods in offenders.items(): print(f"❌ {name} charge {', '.join(mods)}")
+    for f in failures: print(f"❌ {f}")
+    if offenders or failures: sys.exit(1)
+
+if __name__ == "__main__":
+    main()
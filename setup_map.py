@@ -1,35 +1,80 @@
 import requests
 import zipfile
-import io
+import hashlib
 import os
+import sys
 
-print("🚀 DÉMARRAGE DU TÉLÉCHARGEMENT AUTOMATIQUE...")
-print("Source : Serveurs WRI (Amazon S3) - Version Aqueduct 3.0")
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "AquaRisk_App"))
 
 # Lien direct vers la version Shapefile (Fiable et Public)
-url = "http://wri-projects.s3.amazonaws.com/Aqueduct30/finalData/Y2019M07D12_Aqueduct30_PPS_V01.zip"
-
-try:
-    # 1. Téléchargement
-    print("⏳ Téléchargement en cours (500 Mo)... Cela peut prendre 2-3 minutes...")
-    r = requests.get(url)
-    
-    if r.status_code == 200:
-        print("✅ Téléchargement terminé. Décompression...")
-        
-        # 2. Décompression en mémoire
-        z = zipfile.ZipFile(io.BytesIO(r.content))
-        
-        # On extrait seulement le fichier Shapefile (.shp) et ses dépendances (.dbf, .shx, .prj)
-        # pour ne pas polluer le dossier.
+URL = "http://wri-projects.s3.amazonaws.com/Aqueduct30/finalData/Y2019M07D12_Aqueduct30_PPS_V01.zip"
+ZIP_PATH = "Aqueduct30.zip"
+OUT_DIR = "WRI_Data"
+EXPECTED_SHA256 = None   # Renseigner pour vérifier l'archive (sinon l'empreinte est seulement affichée)
+CHUNK = 1024 * 1024      # 1 Mo par bloc : la mémoire reste constante quelle que soit la taille du zip
+
+def sha256_file(path):
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(CHUNK), b''): h.update(block)
+    return h.hexdigest()
+
+def telecharger(url, dest, expected_sha256=None, timeout=60):
+    """Téléchargement en streaming vers dest + '.part', reprise HTTP Range si le fichier partiel existe.
+    Renvoie le sha256 du fichier final (ValueError si différent de expected_sha256)."""
+    if os.path.exists(dest):
+        digest = sha256_file(dest)
+        if not expected_sha256 or digest == expected_sha256: return digest
+        os.remove(dest) # Archive corrompue : on recommence
+
+    part = dest + ".part"
+    deja = os.path.getsize(part) if os.path.exists(part) else 0
+    headers = {'Range': f"bytes={deja}-"} if deja else {}
+    with requests.get(url, headers=headers, stream=True, timeout=timeout) as r:
+        if r.status_code == 416: # Partiel déjà complet
+            pass
+        else:
+            r.raise_for_status()
+            if r.status_code != 206: deja = 0 # Le serveur ignore Range : on repart de zéro
+            total = deja + int(r.headers.get('Content-Length', 0))
+            with open(part, 'ab' if deja else 'wb') as f:
+                recu = deja
+                for block in r.iter_content(CHUNK):
+                    f.write(block); recu += len(block)
+                    if total: print(f"\r⏳ {recu / 1e6:,.0f} / {total / 1e6:,.0f} Mo", end="", flush=True)
+            print()
+            if total and recu != total: raise IOError(f"Téléchargement incomplet ({recu}/{total} octets), relancez pour reprendre.")
+
+    digest = sha256_file(part)
+    if expected_sha256 and digest != expected_sha256:
+        os.remove(part)
+        raise ValueError(f"Checksum invalide : {digest} (attendu {expected_sha256})")
+    os.replace(part, dest)
+    return digest
+
+def extraire_baseline(zip_path, out_dir):
+    """Extrait seulement le Shapefile baseline (.shp) et ses dépendances (.dbf, .shx, .prj)"""
+    with zipfile.ZipFile(zip_path) as z:
         fichiers_a_garder = [f for f in z.namelist() if "baseline" in f and f.endswith(('.shp', '.shx', '.dbf', '.prj'))]
-        
-        z.extractall(path="WRI_Data")
-        print(f"✅ Fichiers extraits dans le dossier 'WRI_Data'")
-        print("🎉 C'est prêt ! Vous avez maintenant la carte précise.")
-        
-    else:
-        print(f"❌ Erreur de téléchargement : Code {r.status_code}")
+        for f in fichiers_a_garder: z.extract(f, path=out_dir)
+    return fichiers_a_garder
 
-except Exception as e:
-    print(f"❌ Erreur critique : {e}")
+if __name__ == "__main__":
+    print("🚀 DÉMARRAGE DU TÉLÉCHARGEMENT AUTOMATIQUE...")
+    print("Source : Serveurs WRI (Amazon S3) - Version Aqueduct 3.0")
+    try:
+        print("⏳ Téléchargement en cours (500 Mo)... Reprise automatique si interrompu.")
+        digest = telecharger(URL, ZIP_PATH, EXPECTED_SHA256)
+        print(f"✅ Téléchargement terminé (sha256 {digest}). Décompression...")
+        fichiers = extraire_baseline(ZIP_PATH, OUT_DIR)
+        print(f"✅ {len(fichiers)} fichiers extraits dans le dossier '{OUT_DIR}'")
+        shps = [f for f in fichiers if f.endswith('.shp')]
+        shp = next((f for f in shps if 'annual' in f), shps[0] if shps else None)
+        if shp:
+            from spatial_index import build_index, AQUEDUCT_INDEX_DB
+            print("⏳ Construction de l'index spatial...")
+            n = build_index(os.path.join(OUT_DIR, shp))
+            print(f"✅ Index '{AQUEDUCT_INDEX_DB}' : {n} bassins indexés.")
+        print("🎉 C'est prêt ! Vous avez maintenant la carte précise.")
+    except Exception as e:
+        print(f"❌ Erreur critique : {e}")